@@ -0,0 +1 @@
+"""Performance benchmarks for streaming and exporting (see __main__)"""
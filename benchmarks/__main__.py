@@ -0,0 +1,139 @@
+"""Runs the benchmark suite
+
+    python -m benchmarks                      # the full suite
+    python -m benchmarks --quick              # small sizes, for a quick check
+    python -m benchmarks --output new.json --baseline baseline.json
+
+Every case runs in its own process against the local mikro stand-in
+(`benchmarks.fake_mikro`). The run fails if a case exceeds its budget or, with
+a baseline, got slower (or used more memory) than the baseline by more than
+the tolerance.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# The cold start of the command line, the exporter and the service
+IMPORTS: List[Tuple[str, str, Dict[str, Any]]] = [
+    (f"import {module}", "import_time", {"module": module})
+    for module in ["gucker.cli", "gucker.export", "gucker.service"]
+]
+
+# (name, case, parameters)
+SUITE: List[Tuple[str, str, Dict[str, Any]]] = IMPORTS + [
+    ("stream 1000 x 64KB", "stream", {"files": 1000, "size_kb": 64}),
+    (
+        "stream 1000 x 64KB batched",
+        "stream",
+        {"files": 1000, "size_kb": 64, "batch_threshold_kb": 128},
+    ),
+    ("stream 100 x 8MB", "stream", {"files": 100, "size_kb": 8192}),
+    ("stream 200 x 1MB 50ms latency", "stream", {"files": 200, "size_kb": 1024, "latency": 0.05}),
+    ("stream latency", "stream_latency", {"files": 20}),
+    ("export stage 4x4", "export_stage", {"positions": 4, "images": 4}),
+    ("export stage 16x8", "export_stage", {"positions": 16, "images": 8}),
+    ("export image 16x1024x1024", "export_image", {"shape": [16, 1024, 1024], "derived": 2}),
+    ("export dataset 50 x 8MB", "export_dataset", {"files": 50, "size_kb": 8192}),
+    (
+        "export dataset 200 x 256KB 50ms latency",
+        "export_dataset",
+        {"files": 200, "size_kb": 256, "latency": 0.05},
+    ),
+]
+
+QUICK_SUITE: List[Tuple[str, str, Dict[str, Any]]] = IMPORTS + [
+    ("stream 100 x 64KB", "stream", {"files": 100, "size_kb": 64}),
+    ("stream latency", "stream_latency", {"files": 5}),
+    ("export stage 2x2", "export_stage", {"positions": 2, "images": 2}),
+    ("export image 4x512x512", "export_image", {"shape": [4, 512, 512], "derived": 1}),
+    ("export dataset 20 x 1MB", "export_dataset", {"files": 20, "size_kb": 1024}),
+]
+
+# Measurements where lower is better, compared against the baseline
+COMPARED = ["seconds", "latency_median_s", "peak_rss_mb"]
+
+# The upper limits of measurements, checked in every run
+BUDGETS: Dict[str, Dict[str, float]] = {
+    "import gucker.cli": {"seconds": 0.2},
+    "import gucker.export": {"seconds": 0.3},
+    # The service registers with arkitekt and calls mikro, both are imported with it
+    "import gucker.service": {"seconds": 3},
+}
+
+
+def run_case(case: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs a benchmark case in a fresh interpreter and returns its results"""
+    process = subprocess.run(
+        [sys.executable, "-m", "benchmarks.cases", case, json.dumps(parameters)],
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode:
+        raise RuntimeError(f"Benchmark {case} failed:\n{process.stderr}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def regressions(
+    results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float
+) -> List[str]:
+    """Lists the measurements that are worse than the baseline by more than the tolerance"""
+    found = []
+    for name, result in results.items():
+        for key in COMPARED:
+            before, after = baseline.get(name, {}).get(key), result.get(key)
+            if before and after and after > before * (1 + tolerance):
+                found.append(f"{name}: {key} {before:.3f} -> {after:.3f}")
+    return found
+
+
+def over_budget(results: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Lists the measurements that exceed their budget"""
+    found = []
+    for name, result in results.items():
+        for key, budget in BUDGETS.get(name, {}).items():
+            if result.get(key, 0) > budget:
+                found.append(f"{name}: {key} {result[key]:.3f} > {budget:.3f}")
+    return found
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Runs the benchmarks and compares them against a baseline"""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="Run the small suite")
+    parser.add_argument("--filter", default="", help="Only run cases containing this text")
+    parser.add_argument("--output", help="Write the results as json")
+    parser.add_argument("--baseline", help="Compare against the results of an earlier run")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed slowdown (0.2 is 20%%)"
+    )
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, case, parameters in QUICK_SUITE if args.quick else SUITE:
+        if args.filter not in name:
+            continue
+        results[name] = result = run_case(case, parameters)
+        measurements = (f"{k}={v:.3f}" for k, v in result.items() if isinstance(v, float))
+        print(f"{name:45} " + "  ".join(measurements))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    exceeded = over_budget(results)
+    for budget in exceeded:
+        print(f"OVER BUDGET {budget}")
+
+    found = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+    return 1 if exceeded or found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""Benchmark cases
+
+Every case runs in a fresh process (see `benchmarks.__main__`), so its peak
+RSS is not inflated by earlier cases. A case is run with
+
+    python -m benchmarks.cases <case> '<json parameters>'
+
+and prints its measurements as json.
+"""
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb() -> float:
+    """The peak resident set size of this process in MB (0 if unknown)"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _write_files(directory: str, count: int, size: int, interval: float = 0) -> None:
+    payload = os.urandom(size)
+    for i in range(count):
+        with open(os.path.join(directory, f"file-{i:06d}.tif"), "wb") as f:
+            f.write(payload)
+        if interval:
+            time.sleep(interval)
+
+
+def stream(
+    tmp_dir: str,
+    files: int = 100,
+    size_kb: int = 1024,
+    concurrency: int = 4,
+    latency: float = 0,
+    batch_threshold_kb: int = 0,
+) -> Dict[str, Any]:
+    """Streams a folder of existing files"""
+    from benchmarks.fake_mikro import FakeMikro
+    from gucker.service import GuckerService, Settings
+
+    watch_dir = os.path.join(tmp_dir, "watch")
+    os.makedirs(watch_dir)
+    _write_files(watch_dir, files, size_kb * 1024)
+
+    mikro = FakeMikro(os.path.join(tmp_dir, "bucket"), latency=latency)
+    service = GuckerService(watch_dir, settings=Settings(grace_period=0, watcher="polling"))
+    with mikro.patch():
+        start = time.perf_counter()
+        uploaded = sum(
+            1
+            for _ in service.stream_files(
+                None,
+                None,
+                concurrency=concurrency,
+                batch_threshold_kb=batch_threshold_kb,
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+    return {
+        "uploaded": uploaded,
+        "seconds": elapsed,
+        "files_per_s": files / elapsed,
+        "mb_per_s": files * size_kb / 1024 / elapsed,
+    }
+
+
+def stream_latency(
+    tmp_dir: str, files: int = 20, size_kb: int = 256, interval: float = 0.1, watcher: str = "auto"
+) -> Dict[str, Any]:
+    """Measures the time from the creation of a file until it is uploaded"""
+    from benchmarks.fake_mikro import FakeMikro
+    from gucker.service import GuckerService, Settings
+
+    watch_dir = os.path.join(tmp_dir, "watch")
+    os.makedirs(watch_dir)
+
+    mikro = FakeMikro(os.path.join(tmp_dir, "bucket"))
+    service = GuckerService(watch_dir, settings=Settings(grace_period=0.2, watcher=watcher))
+    latencies = []
+    with mikro.patch():
+        stream = service.stream_files(None, None, indefinitely=True)
+        writer = threading.Thread(
+            target=_write_files, args=(watch_dir, files, size_kb * 1024, interval)
+        )
+        writer.start()
+        for file in stream:
+            created = os.path.getmtime(os.path.join(watch_dir, file.name))
+            latencies.append(time.time() - created)
+            if len(latencies) == files:
+                break
+        stream.close()
+        writer.join()
+
+    return {
+        "latency_median_s": statistics.median(latencies),
+        "latency_max_s": max(latencies),
+    }
+
+
+def export_stage(
+    tmp_dir: str, positions: int = 4, images: int = 4, shape: list = (4, 512, 512), derived: int = 0
+) -> Dict[str, Any]:
+    """Exports a synthetic stage"""
+    from benchmarks.fake_mikro import FakeMikro
+    from gucker.service import GuckerService
+
+    mikro = FakeMikro(os.path.join(tmp_dir, "bucket"))
+    stage = mikro.add_stage(positions, images, tuple(shape), derived)
+    service = GuckerService(export_dir=os.path.join(tmp_dir, "export"))
+    os.makedirs(service.export_dir)
+    with mikro.patch():
+        start = time.perf_counter()
+        asyncio.run(service.export_stage(stage, incremental=False))
+        return {"seconds": time.perf_counter() - start}
+
+
+def export_image(
+    tmp_dir: str, shape: list = (16, 1024, 1024), derived: int = 2
+) -> Dict[str, Any]:
+    """Exports a synthetic image with derived images"""
+    from benchmarks.fake_mikro import FakeMikro
+    from gucker.service import GuckerService
+
+    mikro = FakeMikro(os.path.join(tmp_dir, "bucket"))
+    representation = mikro.add_representation("Benchmark Image", tuple(shape), derived)
+    service = GuckerService(export_dir=os.path.join(tmp_dir, "export"))
+    os.makedirs(service.export_dir)
+    with mikro.patch():
+        start = time.perf_counter()
+        asyncio.run(service.export_image(representation, incremental=False))
+        return {"seconds": time.perf_counter() - start}
+
+
+def export_dataset(
+    tmp_dir: str, files: int = 50, size_kb: int = 1024, latency: float = 0
+) -> Dict[str, Any]:
+    """Downloads the files of a synthetic dataset"""
+    from benchmarks.fake_mikro import FakeMikro
+    from gucker.service import GuckerService
+
+    mikro = FakeMikro(os.path.join(tmp_dir, "bucket"), latency=latency)
+    dataset = mikro.add_dataset(files, size_kb * 1024, os.path.join(tmp_dir, "originals"))
+    service = GuckerService(export_dir=os.path.join(tmp_dir, "export"))
+    os.makedirs(service.export_dir)
+    with mikro.patch():
+        start = time.perf_counter()
+        asyncio.run(service.export_dataset(dataset, incremental=False))
+        elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "mb_per_s": files * size_kb / 1024 / elapsed}
+
+
+def import_time(tmp_dir: str, module: str = "gucker.cli") -> Dict[str, Any]:
+    """Imports a module in a fresh interpreter (this one already imported the benchmarks)"""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # The cumulative import time (in microseconds) of the module
+    for line in process.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)$", line)
+        if match and match.group(2) == module:
+            return {"seconds": int(match.group(1)) / 10**6}
+    raise RuntimeError(f"{module} not found in the import times")
+
+
+CASES: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "stream": stream,
+    "stream_latency": stream_latency,
+    "export_stage": export_stage,
+    "export_image": export_image,
+    "export_dataset": export_dataset,
+    "import_time": import_time,
+}
+
+
+def main() -> None:
+    """Runs a single case in this process (used by the runner)"""
+    case, parameters = sys.argv[1], json.loads(sys.argv[2] if len(sys.argv) > 2 else "{}")
+    with tempfile.TemporaryDirectory(prefix="gucker-benchmark-") as tmp_dir:
+        # Keep the ledger of the benchmark away from the real one
+        os.environ["GUCKER_DATA_DIR"] = os.path.join(tmp_dir, "data")
+        result = CASES[case](tmp_dir, **parameters)
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""A local stand-in for mikro
+
+Replaces the mikro functions gucker calls (uploads, file lookups and the
+export queries) with in-process fakes, so the benchmarks measure gucker and
+not the network. Uploads are copied into a local "bucket" directory, optionally
+with a fixed latency and a bandwidth limit per upload to mimic the S3 round trip.
+"""
+import asyncio
+import contextvars
+import itertools
+import os
+import shutil
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from unittest import mock
+
+import numpy as np
+
+# Set while a query is called from its async variant, which awaits the latency instead
+_awaiting: contextvars.ContextVar[bool] = contextvars.ContextVar("awaiting", default=False)
+
+
+class FakeModel:
+    """A minimal stand-in for the generated pydantic fragments"""
+
+    def __init__(self, **fields: Any) -> None:
+        self.__dict__.update(fields)
+
+    def dict(self) -> Dict[str, Any]:
+        """The fields of the model (like pydantic's dict, without arrays and lists)"""
+        return {
+            key: value.dict() if isinstance(value, FakeModel) else value
+            for key, value in self.__dict__.items()
+            if not isinstance(value, (np.ndarray, list))
+        }
+
+
+class FakeFile:
+    """A stored file (its value is its path in the bucket directory)"""
+
+    def __init__(self, path: str) -> None:
+        self.value = path
+
+
+class FakeMikro:
+    """Stores uploads in a local directory and serves synthetic export objects
+
+    Args:
+        bucket_dir (str): The directory uploaded files are stored in
+        latency (float, optional): Seconds every request takes. Defaults to 0.
+        bandwidth (float, optional): Bytes/s of a single transfer (0 is unlimited). Defaults to 0.
+    """
+
+    def __init__(self, bucket_dir: str, latency: float = 0, bandwidth: float = 0) -> None:
+        self.bucket_dir = bucket_dir
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.ids = itertools.count(1)
+        self.files: Dict[str, FakeModel] = {}
+        self.stages: Dict[str, FakeModel] = {}
+        self.representations: Dict[str, FakeModel] = {}
+        self.datasets: Dict[str, FakeModel] = {}
+        os.makedirs(bucket_dir, exist_ok=True)
+
+    def wait(self, size: int = 0) -> None:
+        """Sleeps for the latency and the transfer time of a request"""
+        if _awaiting.get():
+            return
+        time.sleep(self.latency + (size / self.bandwidth if self.bandwidth else 0))
+
+    def next_id(self) -> str:
+        """A new unique id"""
+        return str(next(self.ids))
+
+    # Streaming
+
+    def create_dataset(self, name: str, **kwargs: Any) -> FakeModel:
+        """Creates a dataset"""
+        self.wait()
+        dataset = FakeModel(id=self.next_id(), name=name)
+        self.datasets[dataset.id] = dataset
+        return dataset
+
+    def upload_bigfile(
+        self, file: str, datasets: Optional[List[Any]] = None, **kwargs: Any
+    ) -> FakeModel:
+        """Stores a file in the bucket directory"""
+        self.wait(os.path.getsize(file))
+        id = self.next_id()
+        stored = os.path.join(self.bucket_dir, id)
+        shutil.copyfile(file, stored)
+        omero_file = FakeModel(id=id, name=os.path.basename(file), file=FakeFile(stored))
+        self.files[id] = omero_file
+        return omero_file
+
+    def upload_large_file(
+        self, path: str, datasets: Optional[List[Any]] = None, **kwargs: Any
+    ) -> FakeModel:
+        """Stores a file like upload_bigfile (there are no parts locally)"""
+        return self.upload_bigfile(path, datasets)
+
+    def download_file(self, value: str, target: str, **kwargs: Any) -> int:
+        """Copies a stored file (its value can carry a presigned URL query) to the target"""
+        path = value.partition("?")[0]
+        self.wait(os.path.getsize(path))
+        shutil.copyfile(path, target)
+        return os.path.getsize(target)
+
+    def get_omero_file(self, id: str, **kwargs: Any) -> FakeModel:
+        """Returns an uploaded file"""
+        self.wait()
+        return self.files[id]
+
+    # Exporting
+
+    def add_representation(self, name: str, shape: tuple, derived: int = 0) -> FakeModel:
+        """Adds a random image with `derived` derived images"""
+        representation = FakeModel(
+            id=self.next_id(),
+            name=name,
+            data=np.random.randint(0, 2**12, size=shape, dtype=np.uint16),
+            derived=[
+                self.add_representation(f"{name} derived {i}", shape) for i in range(derived)
+            ],
+        )
+        self.representations[representation.id] = representation
+        return representation
+
+    def add_stage(self, positions: int, images: int, shape: tuple, derived: int = 0) -> FakeModel:
+        """Adds a stage with `positions` positions of `images` images each"""
+        stage = FakeModel(id=self.next_id(), name="Benchmark Stage", positions=[])
+        for p in range(positions):
+            position = FakeModel(id=self.next_id(), name=f"Position {p}", omeros=[])
+            for i in range(images):
+                representation = self.add_representation(f"Image {p}-{i}", shape, derived)
+                position.omeros.append(
+                    FakeModel(
+                        id=self.next_id(),
+                        acquisition_date="2023-01-01T00:00:00",
+                        representation=representation,
+                    )
+                )
+            stage.positions.append(position)
+        self.stages[stage.id] = stage
+        return stage
+
+    def add_dataset(self, files: int, size: int, scratch_dir: str) -> FakeModel:
+        """Uploads `files` random files of `size` bytes into a new dataset"""
+        dataset = self.create_dataset("Benchmark Dataset")
+        dataset.omerofiles = []
+        os.makedirs(scratch_dir, exist_ok=True)
+        for i in range(files):
+            path = os.path.join(scratch_dir, f"file-{i}.bin")
+            with open(path, "wb") as f:
+                f.write(os.urandom(size))
+            dataset.omerofiles.append(self.upload_bigfile(path))
+        return dataset
+
+    def get_export_stage_info(self, stage: Any, **kwargs: Any) -> FakeModel:
+        """Returns a stage"""
+        self.wait()
+        return self.stages[getattr(stage, "id", stage)]
+
+    def get_export_positions(
+        self, stage: Any, limit: Optional[int] = None, offset: Optional[int] = None, **kwargs: Any
+    ) -> List[FakeModel]:
+        """Returns a page of the positions of a stage"""
+        self.wait()
+        positions = self.stages[stage].positions[offset or 0 :]
+        return positions[:limit] if limit else positions
+
+    def get_export_derived(self, representation: Any, **kwargs: Any) -> FakeModel:
+        """Returns a representation with its derived images"""
+        return self.get_export_representation(representation)
+
+    def get_export_representation(self, representation: Any, **kwargs: Any) -> FakeModel:
+        """Returns a representation"""
+        self.wait()
+        return self.representations[getattr(representation, "id", representation)]
+
+    def get_export_dataset(self, dataset: Any, **kwargs: Any) -> FakeModel:
+        """Returns a dataset with its files"""
+        self.wait()
+        return self.datasets[getattr(dataset, "id", dataset)]
+
+    @contextmanager
+    def patch(self) -> Iterator["FakeMikro"]:
+        """Routes the mikro calls of gucker to this stand-in"""
+        queries = {
+            "get_export_stage_info": self.get_export_stage_info,
+            "get_export_positions": self.get_export_positions,
+            "get_export_derived": self.get_export_derived,
+            "get_export_representation": self.get_export_representation,
+            "get_export_representation_images": self.get_export_representation,
+            "get_export_representation_rois": self.get_export_representation,
+            "get_export_dataset": self.get_export_dataset,
+        }
+        targets = {
+            "gucker.service.create_dataset": self.create_dataset,
+            "gucker.service.upload_bigfile": self.upload_bigfile,
+            "gucker.service.upload_large_file": self.upload_large_file,
+            "gucker.service.get_omero_file": self.get_omero_file,
+            "gucker.service.log": lambda message, **kwargs: None,
+            "gucker.service.check_cancelled": lambda: None,
+            "gucker.export.download_file": self.download_file,
+            "arkitekt.aprogress": _anoop,
+        }
+        for name, query in queries.items():
+            targets[f"gucker.api.schema.a{name}"] = _async(query, self)
+
+        with ExitStack() as stack:
+            for target, fake in targets.items():
+                stack.enter_context(mock.patch(target, fake))
+            yield self
+
+
+async def _anoop(*args: Any, **kwargs: Any) -> None:
+    pass
+
+
+def _async(query: Callable[..., Any], mikro: FakeMikro) -> Callable[..., Any]:
+    # The latency is awaited, so concurrent queries overlap like real requests
+    async def aquery(*args: Any, **kwargs: Any) -> Any:
+        token = _awaiting.set(True)
+        try:
+            result = query(*args, **kwargs)
+        finally:
+            _awaiting.reset(token)
+        await asyncio.sleep(mikro.latency)
+        return result
+
+    return aquery
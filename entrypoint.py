@@ -1,3 +1,7 @@
-from gucker.main import main
+import multiprocessing
 
+from gucker.cli import main
+
+# The transcoder runs in worker processes, which frozen builds need to bootstrap
+multiprocessing.freeze_support()
 main()
@@ -10,7 +10,7 @@ from mikro.traits import (
     Representation,
     Table,
 )
-from typing import Dict, Optional, Literal, Tuple
+from typing import Dict, Optional, Literal, List, Tuple
 from rath.scalars import ID
 from mikro.funcs import execute, aexecute
 from datetime import datetime
@@ -1174,6 +1174,355 @@ class ExportRepresentationFragment(Representation, BaseModel):
         frozen = True
 
 
+class ExportStageInfoFragment(Stage, BaseModel):
+    typename: Optional[Literal["Stage"]] = Field(alias="__typename", exclude=True)
+    id: ID
+    name: str
+    "The name of the stage"
+
+    class Config:
+        frozen = True
+
+
+class ExportPositionFragmentOmerosTimepointsEra(BaseModel):
+    """Era(id, created_by, created_through, created_while, name, start, end, created_at)"""
+
+    typename: Optional[Literal["Era"]] = Field(alias="__typename", exclude=True)
+    name: str
+    "The name of the era"
+
+    class Config:
+        frozen = True
+
+
+class ExportPositionFragmentOmerosTimepoints(BaseModel):
+    """The relative position of a sample on a microscope stage"""
+
+    typename: Optional[Literal["Timepoint"]] = Field(alias="__typename", exclude=True)
+    era: ExportPositionFragmentOmerosTimepointsEra
+    delta_t: Optional[float] = Field(alias="deltaT")
+
+    class Config:
+        frozen = True
+
+
+class ExportPositionFragmentOmerosRepresentationFileorigins(BaseModel):
+    typename: Optional[Literal["OmeroFile"]] = Field(alias="__typename", exclude=True)
+    id: ID
+    file: Optional[File]
+    " the associaed file"
+
+    class Config:
+        frozen = True
+
+
+class ExportPositionFragmentOmerosRepresentation(Representation, BaseModel):
+    """A Representation is 5-dimensional representation of an image
+
+    Mikro stores each image as sa 5-dimensional representation. The dimensions are:
+    - t: time
+    - c: channel
+    - z: z-stack
+    - x: x-dimension
+    - y: y-dimension
+
+    This ensures a unified api for all images, regardless of their original dimensions. Another main
+    determining factor for a representation is its variety:
+    A representation can be a raw image representating voxels (VOXEL)
+    or a segmentation mask representing instances of a class. (MASK)
+    It can also representate a human perception of the image (RGB) or a human perception of the mask (RGBMASK)
+
+    # Meta
+
+    Meta information is stored in the omero field which gives access to the omero-meta data. Refer to the omero documentation for more information.
+
+
+    #Origins and Derivations
+
+    Images can be filtered, which means that a new representation is created from the other (original) representations. This new representation is then linked to the original representations. This way, we can always trace back to the original representation.
+    Both are encapsulaed in the origins and derived fields.
+
+    Representations belong to *one* sample. Every transaction to our image data is still part of the original acuqistion, so also filtered images are refering back to the sample
+    Each iamge has also a name, which is used to identify the image. The name is unique within a sample.
+    File and Rois that are used to create images are saved in the file origins and roi origins repectively.
+
+
+    """
+
+    typename: Optional[Literal["Representation"]] = Field(
+        alias="__typename", exclude=True
+    )
+    store: Optional[Store]
+    name: Optional[str]
+    "Cleartext name"
+    id: ID
+    file_origins: Tuple[ExportPositionFragmentOmerosRepresentationFileorigins, ...] = Field(
+        alias="fileOrigins"
+    )
+
+    class Config:
+        frozen = True
+
+
+class ExportPositionFragmentOmeros(Omero, BaseModel):
+    """Omero is a through model that stores the real world context of an image
+
+    This means that it stores the position (corresponding to the relative displacement to
+    a stage (Both are models)), objective and other meta data of the image.
+
+    """
+
+    typename: Optional[Literal["Omero"]] = Field(alias="__typename", exclude=True)
+    timepoints: Optional[Tuple[Optional[ExportPositionFragmentOmerosTimepoints], ...]]
+    "Associated Timepoints"
+    acquisition_date: Optional[datetime] = Field(alias="acquisitionDate")
+    representation: ExportPositionFragmentOmerosRepresentation
+
+    class Config:
+        frozen = True
+
+
+class ExportPositionFragment(Position, BaseModel):
+    """The relative position of a sample on a microscope stage"""
+
+    typename: Optional[Literal["Position"]] = Field(alias="__typename", exclude=True)
+    name: str
+    "The name of the possition"
+    id: ID
+    x: float
+    "pixelSize for x in microns"
+    z: float
+    "pixelSize for z in microns"
+    y: float
+    "pixelSize for y in microns"
+    omeros: Optional[Tuple[Optional[ExportPositionFragmentOmeros], ...]]
+    "Associated images through Omero"
+
+    class Config:
+        frozen = True
+
+
+class ExportDerivedFragmentDerivedMetrics(BaseModel):
+    typename: Optional[Literal["Metric"]] = Field(alias="__typename", exclude=True)
+    id: ID
+    key: str
+    "The Key"
+    value: Optional[MetricValue]
+    "Value"
+
+    class Config:
+        frozen = True
+
+
+class ExportDerivedFragmentDerived(Representation, BaseModel):
+    """A Representation is 5-dimensional representation of an image
+
+    Mikro stores each image as sa 5-dimensional representation. The dimensions are:
+    - t: time
+    - c: channel
+    - z: z-stack
+    - x: x-dimension
+    - y: y-dimension
+
+    This ensures a unified api for all images, regardless of their original dimensions. Another main
+    determining factor for a representation is its variety:
+    A representation can be a raw image representating voxels (VOXEL)
+    or a segmentation mask representing instances of a class. (MASK)
+    It can also representate a human perception of the image (RGB) or a human perception of the mask (RGBMASK)
+
+    # Meta
+
+    Meta information is stored in the omero field which gives access to the omero-meta data. Refer to the omero documentation for more information.
+
+
+    #Origins and Derivations
+
+    Images can be filtered, which means that a new representation is created from the other (original) representations. This new representation is then linked to the original representations. This way, we can always trace back to the original representation.
+    Both are encapsulaed in the origins and derived fields.
+
+    Representations belong to *one* sample. Every transaction to our image data is still part of the original acuqistion, so also filtered images are refering back to the sample
+    Each iamge has also a name, which is used to identify the image. The name is unique within a sample.
+    File and Rois that are used to create images are saved in the file origins and roi origins repectively.
+
+
+    """
+
+    typename: Optional[Literal["Representation"]] = Field(
+        alias="__typename", exclude=True
+    )
+    id: ID
+    store: Optional[Store]
+    name: Optional[str]
+    "Cleartext name"
+    metrics: Optional[Tuple[Optional[ExportDerivedFragmentDerivedMetrics], ...]]
+    "Associated metrics of this Imasge"
+
+    class Config:
+        frozen = True
+
+
+class ExportDerivedFragment(Representation, BaseModel):
+    """A Representation is 5-dimensional representation of an image
+
+    Mikro stores each image as sa 5-dimensional representation. The dimensions are:
+    - t: time
+    - c: channel
+    - z: z-stack
+    - x: x-dimension
+    - y: y-dimension
+
+    This ensures a unified api for all images, regardless of their original dimensions. Another main
+    determining factor for a representation is its variety:
+    A representation can be a raw image representating voxels (VOXEL)
+    or a segmentation mask representing instances of a class. (MASK)
+    It can also representate a human perception of the image (RGB) or a human perception of the mask (RGBMASK)
+
+    # Meta
+
+    Meta information is stored in the omero field which gives access to the omero-meta data. Refer to the omero documentation for more information.
+
+
+    #Origins and Derivations
+
+    Images can be filtered, which means that a new representation is created from the other (original) representations. This new representation is then linked to the original representations. This way, we can always trace back to the original representation.
+    Both are encapsulaed in the origins and derived fields.
+
+    Representations belong to *one* sample. Every transaction to our image data is still part of the original acuqistion, so also filtered images are refering back to the sample
+    Each iamge has also a name, which is used to identify the image. The name is unique within a sample.
+    File and Rois that are used to create images are saved in the file origins and roi origins repectively.
+
+
+    """
+
+    typename: Optional[Literal["Representation"]] = Field(
+        alias="__typename", exclude=True
+    )
+    id: ID
+    derived: Optional[Tuple[Optional[ExportDerivedFragmentDerived], ...]]
+    "Derived Images from this Image"
+
+    class Config:
+        frozen = True
+
+
+class ExportOmeroFragmentPhysicalsize(PhysicalSize, BaseModel):
+    """Physical size of the image
+
+    Each dimensions of the image has a physical size. This is the size of the
+    pixel in the image. The physical size is given in micrometers on a PIXEL
+    basis. This means that the physical size of the image is the size of the
+    pixel in the image * the number of pixels in the image. For example, if
+    the image is 1000x1000 pixels and the physical size of the image is 3 (x params) x 3 (y params),
+    micrometer, the physical size of the image is 3000x3000 micrometer. If the image
+
+    The t dimension is given in ms, since the time is given in ms.
+    The C dimension is given in nm, since the wavelength is given in nm."""
+
+    typename: Optional[Literal["PhysicalSize"]] = Field(
+        alias="__typename", exclude=True
+    )
+    x: Optional[float]
+    "Physical size of *one* Pixel in the x dimension (in µm)"
+    y: Optional[float]
+    "Physical size of *one* Pixel in the t dimension (in µm)"
+    z: Optional[float]
+    "Physical size of *one* Pixel in the z dimension (in µm)"
+    t: Optional[float]
+    "Physical size of *one* Pixel in the t dimension (in ms)"
+    c: Optional[float]
+    "Physical size of *one* Pixel in the c dimension (in µm)"
+
+    class Config:
+        frozen = True
+
+
+class ExportOmeroFragment(Omero, BaseModel):
+    """Omero is a through model that stores the real world context of an image
+
+    This means that it stores the position (corresponding to the relative displacement to
+    a stage (Both are models)), objective and other meta data of the image.
+
+    """
+
+    typename: Optional[Literal["Omero"]] = Field(alias="__typename", exclude=True)
+    id: ID
+    physical_size: Optional[ExportOmeroFragmentPhysicalsize] = Field(alias="physicalSize")
+
+    class Config:
+        frozen = True
+
+
+class ExportRepresentationImagesFragment(Representation, BaseModel):
+    typename: Optional[Literal["Representation"]] = Field(
+        alias="__typename", exclude=True
+    )
+    id: ID
+    name: Optional[str]
+    "Cleartext name"
+    store: Optional[Store]
+    omero: Optional[ExportOmeroFragment]
+
+    class Config:
+        frozen = True
+
+
+class ExportRepresentationRoisFragmentRoisVectors(BaseModel):
+    typename: Optional[Literal["Vector"]] = Field(alias="__typename", exclude=True)
+    x: Optional[float]
+    "X-coordinate"
+    y: Optional[float]
+    "Y-coordinate"
+    z: Optional[float]
+    "Z-coordinate"
+    t: Optional[float]
+    "T-coordinate"
+    c: Optional[float]
+    "C-coordinate"
+
+    class Config:
+        frozen = True
+
+
+class ExportRepresentationRoisFragmentRois(ROI, BaseModel):
+    """A ROI is a region of interest in a representation.
+
+    This region is to be regarded as a view on the representation. Depending
+    on the implementatoin (type) of the ROI, the view can be constructed
+    differently. For example, a rectangular ROI can be constructed by cropping
+    the representation according to its 2 vectors. while a polygonal ROI can be constructed by masking the
+    representation with the polygon.
+
+    The ROI can also store a name and a description. This is used to display the ROI in the UI.
+
+    """
+
+    typename: Optional[Literal["ROI"]] = Field(alias="__typename", exclude=True)
+    id: ID
+    type: ROIType
+    "The Roi can have varying types, consult your API"
+    vectors: Optional[Tuple[Optional[ExportRepresentationRoisFragmentRoisVectors], ...]]
+    "The vectors of the ROI"
+
+    class Config:
+        frozen = True
+
+
+class ExportRepresentationRoisFragment(Representation, BaseModel):
+    typename: Optional[Literal["Representation"]] = Field(
+        alias="__typename", exclude=True
+    )
+    id: ID
+    name: Optional[str]
+    "Cleartext name"
+    store: Optional[Store]
+    omero: Optional[ExportOmeroFragment]
+    rois: Optional[Tuple[Optional[ExportRepresentationRoisFragmentRois], ...]]
+    "Associated rois"
+
+    class Config:
+        frozen = True
+
+
 class GetExportStageQuery(BaseModel):
     stage: Optional[ExportStageFragment]
     'Get a single experiment by ID"\n    \n    Returns a single experiment by ID. If the user does not have access\n    to the experiment, an error will be raised.\n    \n    '
@@ -1207,6 +1556,63 @@ class GetExportRepresentationQuery(BaseModel):
         document = "fragment ExportRepresentation on Representation {\n  fileOrigins {\n    name\n    createdAt\n  }\n  id\n  name\n  omero {\n    id\n    physicalSize {\n      x\n      y\n      z\n      t\n      c\n    }\n    timepoints {\n      id\n    }\n  }\n  rois {\n    id\n    comments {\n      id\n    }\n    creator {\n      sub\n    }\n    vectors {\n      x\n      y\n      z\n      t\n      c\n    }\n    type\n    derivedRepresentations {\n      id\n      name\n      store\n      metrics {\n        key\n        value\n      }\n      derived(flatten: 3) {\n        id\n        name\n        store\n        metrics {\n          key\n          value\n        }\n        tables {\n          id\n          name\n          store\n        }\n      }\n    }\n  }\n  store\n}\n\nquery GetExportRepresentation($id: ID!) {\n  representation(id: $id) {\n    ...ExportRepresentation\n  }\n}"
 
 
+class GetExportStageInfoQuery(BaseModel):
+    stage: Optional[ExportStageInfoFragment]
+    'Get a single experiment by ID"\n    \n    Returns a single experiment by ID. If the user does not have access\n    to the experiment, an error will be raised.\n    \n    '
+
+    class Arguments(BaseModel):
+        id: ID
+
+    class Meta:
+        document = "fragment ExportStageInfo on Stage {\n  id\n  name\n}\n\nquery GetExportStageInfo($id: ID!) {\n  stage(id: $id) {\n    ...ExportStageInfo\n  }\n}"
+
+
+class GetExportPositionsQuery(BaseModel):
+    positions: Optional[Tuple[Optional[ExportPositionFragment], ...]]
+    "All Positions\n    \n    This query returns all Positions that are stored on the platform\n    depending on the user's permissions. Generally, this query will return\n    all Positions that the user has access to. If the user is an amdin\n    or superuser, all Positions will be returned.\n    "
+
+    class Arguments(BaseModel):
+        stage: ID
+        limit: Optional[int] = Field(default=None)
+        offset: Optional[int] = Field(default=None)
+
+    class Meta:
+        document = "fragment ExportPosition on Position {\n  name\n  id\n  x\n  z\n  y\n  omeros {\n    timepoints {\n      era {\n        name\n      }\n      deltaT\n    }\n    acquisitionDate\n    representation {\n      store\n      name\n      id\n      fileOrigins {\n        id\n        file\n      }\n    }\n  }\n}\n\nquery GetExportPositions($stage: ID!, $limit: Int, $offset: Int) {\n  positions(stage: $stage, limit: $limit, offset: $offset) {\n    ...ExportPosition\n  }\n}"
+
+
+class GetExportDerivedQuery(BaseModel):
+    representation: Optional[ExportDerivedFragment]
+    "Get a single Representation by ID\n\n    Returns a single Representation by ID. If the user does not have access\n    to the Representation, an error will be raised.\n    "
+
+    class Arguments(BaseModel):
+        id: ID
+
+    class Meta:
+        document = "fragment ExportDerived on Representation {\n  id\n  derived(flatten: 4) {\n    id\n    store\n    name\n    metrics {\n      id\n      key\n      value\n    }\n  }\n}\n\nquery GetExportDerived($id: ID!) {\n  representation(id: $id) {\n    ...ExportDerived\n  }\n}"
+
+
+class GetExportRepresentationImagesQuery(BaseModel):
+    representation: Optional[ExportRepresentationImagesFragment]
+    "Get a single Representation by ID\n\n    Returns a single Representation by ID. If the user does not have access\n    to the Representation, an error will be raised.\n    "
+
+    class Arguments(BaseModel):
+        id: ID
+
+    class Meta:
+        document = "fragment ExportOmero on Omero {\n  id\n  physicalSize {\n    x\n    y\n    z\n    t\n    c\n  }\n}\n\nfragment ExportRepresentationImages on Representation {\n  id\n  name\n  store\n  omero {\n    ...ExportOmero\n  }\n}\n\nquery GetExportRepresentationImages($id: ID!) {\n  representation(id: $id) {\n    ...ExportRepresentationImages\n  }\n}"
+
+
+class GetExportRepresentationRoisQuery(BaseModel):
+    representation: Optional[ExportRepresentationRoisFragment]
+    "Get a single Representation by ID\n\n    Returns a single Representation by ID. If the user does not have access\n    to the Representation, an error will be raised.\n    "
+
+    class Arguments(BaseModel):
+        id: ID
+
+    class Meta:
+        document = "fragment ExportOmero on Omero {\n  id\n  physicalSize {\n    x\n    y\n    z\n    t\n    c\n  }\n}\n\nfragment ExportRepresentationRois on Representation {\n  id\n  name\n  store\n  omero {\n    ...ExportOmero\n  }\n  rois {\n    id\n    type\n    vectors {\n      x\n      y\n      z\n      t\n      c\n    }\n  }\n}\n\nquery GetExportRepresentationRois($id: ID!) {\n  representation(id: $id) {\n    ...ExportRepresentationRois\n  }\n}"
+
+
 async def aget_export_stage(
     id: ID, rath: MikroRath = None
 ) -> Optional[ExportStageFragment]:
@@ -1393,5 +1799,209 @@ def get_export_representation(
     return execute(GetExportRepresentationQuery, {"id": id}, rath=rath).representation
 
 
+async def aget_export_stage_info(
+    id: ID, rath: MikroRath = None
+) -> Optional[ExportStageInfoFragment]:
+    """GetExportStageInfo
+
+
+     stage: An Stage is a set of positions that share a common space on a microscope and can
+        be use to translate.
+
+
+
+
+
+    Arguments:
+        id (ID): id
+        rath (mikro.rath.MikroRath, optional): The mikro rath client
+
+    Returns:
+        Optional[ExportStageInfoFragment]"""
+    return (await aexecute(GetExportStageInfoQuery, {"id": id}, rath=rath)).stage
+
+
+def get_export_stage_info(id: ID, rath: MikroRath = None) -> Optional[ExportStageInfoFragment]:
+    """GetExportStageInfo
+
+
+     stage: An Stage is a set of positions that share a common space on a microscope and can
+        be use to translate.
+
+
+
+
+
+    Arguments:
+        id (ID): id
+        rath (mikro.rath.MikroRath, optional): The mikro rath client
+
+    Returns:
+        Optional[ExportStageInfoFragment]"""
+    return execute(GetExportStageInfoQuery, {"id": id}, rath=rath).stage
+
+
+async def aget_export_positions(
+    stage: ID,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    rath: MikroRath = None,
+) -> Optional[List[Optional[ExportPositionFragment]]]:
+    """GetExportPositions
+
+
+     positions: The relative position of a sample on a microscope stage
+
+
+    Arguments:
+        stage (ID): stage
+        limit (Optional[int], optional): limit.
+        offset (Optional[int], optional): offset.
+        rath (mikro.rath.MikroRath, optional): The mikro rath client
+
+    Returns:
+        Optional[List[Optional[ExportPositionFragment]]]"""
+    return (
+        await aexecute(
+            GetExportPositionsQuery,
+            {"stage": stage, "limit": limit, "offset": offset},
+            rath=rath,
+        )
+    ).positions
+
+
+def get_export_positions(
+    stage: ID,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    rath: MikroRath = None,
+) -> Optional[List[Optional[ExportPositionFragment]]]:
+    """GetExportPositions
+
+
+     positions: The relative position of a sample on a microscope stage
+
+
+    Arguments:
+        stage (ID): stage
+        limit (Optional[int], optional): limit.
+        offset (Optional[int], optional): offset.
+        rath (mikro.rath.MikroRath, optional): The mikro rath client
+
+    Returns:
+        Optional[List[Optional[ExportPositionFragment]]]"""
+    return execute(
+        GetExportPositionsQuery,
+        {"stage": stage, "limit": limit, "offset": offset},
+        rath=rath,
+    ).positions
+
+
+async def aget_export_derived(
+    id: ID, rath: MikroRath = None
+) -> Optional[ExportDerivedFragment]:
+    """GetExportDerived
+
+
+     representation: A Representation is 5-dimensional representation of an image
+
+
+    Arguments:
+        id (ID): id
+        rath (mikro.rath.MikroRath, optional): The mikro rath client
+
+    Returns:
+        Optional[ExportDerivedFragment]"""
+    return (await aexecute(GetExportDerivedQuery, {"id": id}, rath=rath)).representation
+
+
+def get_export_derived(id: ID, rath: MikroRath = None) -> Optional[ExportDerivedFragment]:
+    """GetExportDerived
+
+
+     representation: A Representation is 5-dimensional representation of an image
+
+
+    Arguments:
+        id (ID): id
+        rath (mikro.rath.MikroRath, optional): The mikro rath client
+
+    Returns:
+        Optional[ExportDerivedFragment]"""
+    return execute(GetExportDerivedQuery, {"id": id}, rath=rath).representation
+
+
+async def aget_export_representation_images(
+    id: ID, rath: MikroRath = None
+) -> Optional[ExportRepresentationImagesFragment]:
+    """GetExportRepresentationImages
+
+
+     representation: A Representation is 5-dimensional representation of an image
+
+
+    Arguments:
+        id (ID): id
+        rath (mikro.rath.MikroRath, optional): The mikro rath client
+
+    Returns:
+        Optional[ExportRepresentationImagesFragment]"""
+    return (await aexecute(GetExportRepresentationImagesQuery, {"id": id}, rath=rath)).representation
+
+
+def get_export_representation_images(
+    id: ID, rath: MikroRath = None
+) -> Optional[ExportRepresentationImagesFragment]:
+    """GetExportRepresentationImages
+
+
+     representation: A Representation is 5-dimensional representation of an image
+
+
+    Arguments:
+        id (ID): id
+        rath (mikro.rath.MikroRath, optional): The mikro rath client
+
+    Returns:
+        Optional[ExportRepresentationImagesFragment]"""
+    return execute(GetExportRepresentationImagesQuery, {"id": id}, rath=rath).representation
+
+
+async def aget_export_representation_rois(
+    id: ID, rath: MikroRath = None
+) -> Optional[ExportRepresentationRoisFragment]:
+    """GetExportRepresentationRois
+
+
+     representation: A Representation is 5-dimensional representation of an image
+
+
+    Arguments:
+        id (ID): id
+        rath (mikro.rath.MikroRath, optional): The mikro rath client
+
+    Returns:
+        Optional[ExportRepresentationRoisFragment]"""
+    return (await aexecute(GetExportRepresentationRoisQuery, {"id": id}, rath=rath)).representation
+
+
+def get_export_representation_rois(
+    id: ID, rath: MikroRath = None
+) -> Optional[ExportRepresentationRoisFragment]:
+    """GetExportRepresentationRois
+
+
+     representation: A Representation is 5-dimensional representation of an image
+
+
+    Arguments:
+        id (ID): id
+        rath (mikro.rath.MikroRath, optional): The mikro rath client
+
+    Returns:
+        Optional[ExportRepresentationRoisFragment]"""
+    return execute(GetExportRepresentationRoisQuery, {"id": id}, rath=rath).representation
+
+
 DescendendInput.update_forward_refs()
 OmeroRepresentationInput.update_forward_refs()
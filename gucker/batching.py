@@ -0,0 +1,130 @@
+"""Batching of small files
+
+Every upload costs a few round trips (presign, upload, create), which
+dominates for files of a few hundred KB. The batcher collects small files
+that arrive within a time window and packs them into a single (uncompressed)
+zip archive with an `index.json` describing its members, so they are uploaded
+as one OmeroFile.
+"""
+import json
+import logging
+import os
+import time
+import zipfile
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.json"
+
+
+def write_archive(paths: List[str], base_dir: str, archive_path: str) -> str:
+    """Packs files into a zip archive with an index
+
+    Members are stored uncompressed under their path relative to `base_dir`.
+
+    Args:
+        paths (List[str]): The files to pack
+        base_dir (str): The directory the member names are relative to
+        archive_path (str): The path of the archive
+
+    Returns:
+        str: The path of the archive
+    """
+    index = []
+    with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_STORED) as archive:
+        for path in paths:
+            name = os.path.relpath(path, base_dir).replace(os.sep, "/")
+            stat = os.stat(path)
+            archive.write(path, arcname=name)
+            index.append({"name": name, "size": stat.st_size, "mtime": stat.st_mtime})
+
+        archive.writestr(INDEX_NAME, json.dumps({"files": index}, indent=2))
+    return archive_path
+
+
+class Batcher:
+    """Collects small files into batches
+
+    A batch is due once `window` seconds passed since its first file, or once
+    it reached `max_bytes` or `max_files`.
+
+    Args:
+        threshold (int): Files smaller than this (in bytes) are batched
+        window (float, optional): Seconds to wait for more files. Defaults to 2.
+        max_bytes (int, optional): The maximum size of a batch. Defaults to 64 MB.
+        max_files (int, optional): The maximum number of files in a batch. Defaults to 1000.
+    """
+
+    def __init__(
+        self,
+        threshold: int,
+        window: float = 2,
+        max_bytes: int = 64 * 1024**2,
+        max_files: int = 1000,
+    ) -> None:
+        self.threshold = threshold
+        self.window = window
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+
+        self.files: List[str] = []
+        self.size = 0
+        self.started: Optional[float] = None
+
+    @property
+    def pending(self) -> int:
+        """The number of files waiting in the current batch"""
+        return len(self.files)
+
+    def accepts(self, path: str) -> bool:
+        """Checks if a file is small enough to be batched (files that cannot be read are not)"""
+        try:
+            return self.threshold > 0 and os.path.getsize(path) < self.threshold
+        except OSError:
+            return False
+
+    def add(self, path: str) -> None:
+        """Adds a file to the current batch (files that cannot be read are skipped)"""
+        try:
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Skipping {path} from the batch ({e})")
+            return
+
+        if not self.files:
+            self.started = time.monotonic()
+        self.files.append(path)
+        self.size += size
+
+    def is_due(self) -> bool:
+        """Checks if the current batch should be uploaded"""
+        if not self.files:
+            return False
+        return (
+            self.size >= self.max_bytes
+            or len(self.files) >= self.max_files
+            or time.monotonic() - self.started >= self.window
+        )
+
+    def take(self, force: bool = False) -> List[str]:
+        """Returns the files of the current batch if it is due (or forced) and starts a new one
+
+        Args:
+            force (bool, optional): Return the batch even if it is not due. Defaults to False.
+
+        Returns:
+            List[str]: The files (empty if the batch is not due)
+        """
+        if not (self.is_due() or (force and self.files)):
+            return []
+
+        files, self.files, self.size, self.started = self.files, [], 0, None
+        return files
+
+    def timeout(self, default: float = 1) -> float:
+        """How long to wait before the current batch becomes due"""
+        if not self.files:
+            return default
+        remaining = self.window - (time.monotonic() - self.started)
+        return min(default, max(0, remaining))
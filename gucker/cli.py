@@ -0,0 +1,118 @@
+"""Command line interface
+
+`gucker` starts the desktop application, `gucker serve` runs the same
+rekuest functions headless (without Qt), e.g. on acquisition servers:
+
+    gucker serve --watch /data/acquisition --export /data/export
+"""
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Builds the argument parser of the `gucker` command"""
+    parser = argparse.ArgumentParser(
+        prog="gucker", description="Stream your files to the mikro/arkitekt platform"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    serve = subparsers.add_parser("serve", help="Run headless, without the desktop window")
+    serve.add_argument("--watch", default="", help="The directory to stream files from")
+    serve.add_argument("--export", default="", help="The directory to export to")
+    serve.add_argument(
+        "--identifier",
+        default="github.io.jhnnsrs.gucker",
+        help="The identifier the app registers with arkitekt",
+    )
+    serve.add_argument("--version", default="latest", help="The version the app registers with")
+    serve.add_argument(
+        "--watcher",
+        choices=["auto", "native", "polling"],
+        default="auto",
+        help="How to detect new files (polling works on all file systems)",
+    )
+    serve.add_argument(
+        "--grace-period",
+        type=float,
+        default=2,
+        help="Seconds a file has to stay unchanged before it is uploaded",
+    )
+    serve.add_argument(
+        "--max-upload-rate",
+        type=float,
+        default=0,
+        help="The maximum average upload rate in MB/s (0 is unlimited)",
+    )
+    serve.add_argument(
+        "--upload-schedule",
+        default="",
+        help='Upload rates by time of day, e.g. "08:00-20:00=20;20:00-08:00=0" (MB/s)',
+    )
+    serve.add_argument(
+        "--export-concurrency", type=int, default=8, help="Concurrent export tasks"
+    )
+    serve.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="Serve Prometheus metrics on this local port (0 disables the endpoint)",
+    )
+    serve.add_argument("--log-level", default="INFO", help="The python log level")
+    serve.add_argument(
+        "--log-format",
+        choices=["text", "json"],
+        default="text",
+        help="Write the logs as text or as json lines (including upload and export spans)",
+    )
+    return parser
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Runs the Gucker service headless"""
+    from arkitekt.builders import easy
+
+    from gucker.metrics import JsonFormatter, start_http_server
+    from gucker.service import GuckerService, Settings
+
+    logging.basicConfig(level=args.log_level)
+    if args.log_format == "json":
+        for handler in logging.getLogger().handlers:
+            handler.setFormatter(JsonFormatter())
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+
+    service = GuckerService(
+        base_dir=args.watch,
+        export_dir=args.export,
+        settings=Settings(
+            watcher=args.watcher,
+            grace_period=args.grace_period,
+            max_upload_rate=args.max_upload_rate,
+            upload_schedule=args.upload_schedule,
+            export_concurrency=args.export_concurrency,
+        ),
+    )
+
+    app = easy(identifier=args.identifier, version=args.version)
+    service.register(app.rekuest)
+
+    with app:
+        app.rekuest.run()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Entrypoint for the gucker command"""
+    args = build_parser().parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.command == "serve":
+        serve(args)
+    else:
+        from gucker.main import main as gui
+
+        gui()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""Direct access to the datalayer
+
+mikro stores files in the S3 object store of its datalayer. `upload_bigfile`
+sends a file in a single request, so an interrupted upload starts over. Large
+files are instead uploaded here as a multipart upload through the file system
+of the datalayer (s3fs). The parts are uploaded in parallel, and the upload
+id is checkpointed in the gucker data directory, so a retry, a crash or a
+restart continues with the parts the object store is missing. The uploaded
+object is then registered with mikro like an upload of `upload_bigfile`.
+
+Downloads read stored files through the same file system. A partial download
+is continued with a ranged read from where it stopped, and the result is
+checked against the size (and, where available, the MD5) of the object.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from gucker.env import get_data_dir
+
+logger = logging.getLogger(__name__)
+
+# The bucket upload_bigfile stores files in
+BUCKET = "mikromedia"
+# S3 requires all parts but the last to be at least 5 MB
+MIN_PART_SIZE = 5 * 1024**2
+DOWNLOAD_BLOCK_SIZE = 8 * 1024**2
+
+
+def datalayer_fs() -> Any:
+    """The file system (s3fs) of the current datalayer, connected if necessary"""
+    from koil import unkoil
+    from mikro.datalayer import current_datalayer
+
+    datalayer = current_datalayer.get()
+    if not datalayer._connected:
+        unkoil(datalayer.aconnect)
+    return datalayer.fs
+
+
+def _read_checkpoint(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+def _list_parts(fs: Any, bucket: str, key: str, upload_id: str) -> Dict[int, str]:
+    parts: Dict[int, str] = {}
+    marker = 0
+    while True:
+        response = fs.call_s3(
+            "list_parts", Bucket=bucket, Key=key, UploadId=upload_id, PartNumberMarker=marker
+        )
+        for part in response.get("Parts", []):
+            parts[part["PartNumber"]] = part["ETag"]
+        if not response.get("IsTruncated"):
+            return parts
+        marker = response["NextPartNumberMarker"]
+
+
+def _upload_part(
+    fs: Any, path: str, bucket: str, key: str, upload_id: str, number: int, part_size: int
+) -> str:
+    with open(path, "rb") as f:
+        f.seek((number - 1) * part_size)
+        body = f.read(part_size)
+    response = fs.call_s3(
+        "upload_part", Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+    )
+    return response["ETag"]
+
+
+def upload_parts(
+    fs: Any,
+    path: str,
+    key: str,
+    checkpoint_path: str,
+    bucket: str = BUCKET,
+    part_size: int = 16 * 1024**2,
+    max_workers: int = 4,
+) -> str:
+    """Uploads a file as a resumable multipart upload
+
+    An upload checkpointed for the same (unchanged) file continues with the
+    parts the object store does not have yet. The checkpoint is removed once
+    the upload is complete.
+
+    Args:
+        fs (Any): The s3fs file system
+        path (str): The path of the file
+        key (str): The key of the object in the bucket
+        checkpoint_path (str): The json file the upload is checkpointed in
+        bucket (str, optional): The bucket. Defaults to the bucket of upload_bigfile.
+        part_size (int, optional): The size of a part in bytes. Defaults to 16 MB.
+        max_workers (int, optional): The number of parts uploaded at the same time.
+            Defaults to 4.
+
+    Returns:
+        str: The key of the uploaded object
+    """
+    part_size = max(part_size, MIN_PART_SIZE)
+    stat = os.stat(path)
+    origin = {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "bucket": bucket,
+        "key": key,
+        "part_size": part_size,
+    }
+
+    checkpoint = _read_checkpoint(checkpoint_path)
+    parts: Dict[int, str] = {}
+    if checkpoint and all(checkpoint.get(name) == value for name, value in origin.items()):
+        try:
+            # The object store knows best which parts arrived
+            parts = _list_parts(fs, bucket, key, checkpoint["upload_id"])
+        except Exception as e:
+            logger.info(f"Restarting the upload of {path} ({e})")
+            checkpoint = {}
+    elif checkpoint:
+        try:
+            fs.call_s3(
+                "abort_multipart_upload",
+                Bucket=checkpoint["bucket"],
+                Key=checkpoint["key"],
+                UploadId=checkpoint["upload_id"],
+            )
+        except Exception as e:
+            logger.debug(f"Could not abort the outdated upload of {path} ({e})")
+        checkpoint = {}
+
+    if not checkpoint:
+        response = fs.call_s3("create_multipart_upload", Bucket=bucket, Key=key)
+        checkpoint = {**origin, "upload_id": response["UploadId"]}
+        _write_checkpoint(checkpoint_path, checkpoint)
+    else:
+        logger.info(f"Resuming the upload of {path} with {len(parts)} uploaded parts")
+    upload_id = checkpoint["upload_id"]
+
+    count = max(1, math.ceil(stat.st_size / part_size))
+    missing = [number for number in range(1, count + 1) if number not in parts]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(
+                _upload_part, fs, path, bucket, key, upload_id, number, part_size
+            ): number
+            for number in missing
+        }
+        # A failed part fails the upload once the other parts are done, so a
+        # retry only uploads what is still missing
+        for future in as_completed(futures):
+            parts[futures[future]] = future.result()
+
+    fs.call_s3(
+        "complete_multipart_upload",
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={
+            "Parts": [{"PartNumber": number, "ETag": parts[number]} for number in sorted(parts)]
+        },
+    )
+    os.remove(checkpoint_path)
+    return key
+
+
+def register_upload(key: str, datasets: Optional[List[str]] = None) -> Any:
+    """Creates the OmeroFile of an object uploaded to the bucket of upload_bigfile
+
+    Sends the mutation of `upload_bigfile` with the key of the object instead
+    of a file, so the datalayer link does not upload the file again.
+
+    Args:
+        key (str): The key of the object
+        datasets (Optional[List[str]], optional): The ids of the datasets. Defaults to None.
+
+    Returns:
+        Upload_bigfileMutationUploadbigfile: The created file
+    """
+    from mikro.api.schema import Upload_bigfileMutation
+    from mikro.rath import current_mikro_rath
+    from mikro.scalars import get_current_id
+
+    variables = {"file": key, "datasets": datasets, "created_while": get_current_id(None, None)}
+    result = current_mikro_rath.get().query(Upload_bigfileMutation.Meta.document, variables)
+    return Upload_bigfileMutation(**result.data).upload_big_file
+
+
+def upload_large_file(
+    path: str,
+    datasets: Optional[List[str]] = None,
+    part_size: int = 16 * 1024**2,
+    max_workers: int = 4,
+) -> Any:
+    """Uploads a file in resumable parts and registers it with mikro
+
+    Args:
+        path (str): The path of the file
+        datasets (Optional[List[str]], optional): The ids of the datasets. Defaults to None.
+        part_size (int, optional): The size of a part in bytes. Defaults to 16 MB.
+        max_workers (int, optional): The number of parts uploaded at the same time.
+            Defaults to 4.
+
+    Returns:
+        Upload_bigfileMutationUploadbigfile: The created file
+    """
+    checkpoint_dir = os.path.join(get_data_dir(), "uploads")
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    name = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=16).hexdigest()
+
+    # Stored under its file name, like upload_bigfile does
+    key = upload_parts(
+        datalayer_fs(),
+        path,
+        os.path.basename(path),
+        os.path.join(checkpoint_dir, f"{name}.json"),
+        part_size=part_size,
+        max_workers=max_workers,
+    )
+    return register_upload(key, datasets)
+
+
+def object_path(value: str) -> str:
+    """The path of a stored file (the value of a mikro File) in the datalayer file system"""
+    return value.split("?")[0].lstrip("/")
+
+
+def download_file(value: str, target: str, fs: Optional[Any] = None) -> int:
+    """Downloads a stored file, continuing a partial download in the target
+
+    Bytes already in the target are kept, only the rest of the object is read.
+    The result is checked against the size of the object and, for objects
+    uploaded in a single request (whose ETag is their MD5), its checksum.
+
+    Args:
+        value (str): The value of the mikro File
+        target (str): The path to download to
+        fs (Optional[Any], optional): The file system. Defaults to the one of the datalayer.
+
+    Raises:
+        IOError: If the downloaded file does not match the object
+
+    Returns:
+        int: The size of the file
+    """
+    fs = fs or datalayer_fs()
+    path = object_path(value)
+    info = fs.info(path)
+    size = info["size"]
+    etag = str(info.get("ETag", "")).strip('"')
+    md5 = hashlib.md5() if re.fullmatch("[0-9a-f]{32}", etag) else None
+
+    offset = os.path.getsize(target) if os.path.exists(target) else 0
+    if offset > size:
+        offset = 0
+    with open(target, "r+b" if offset else "wb") as f:
+        while md5 and f.tell() < offset:
+            md5.update(f.read(min(DOWNLOAD_BLOCK_SIZE, offset - f.tell())))
+        f.seek(offset)
+        f.truncate()
+        if offset < size:
+            with fs.open(path, "rb", block_size=DOWNLOAD_BLOCK_SIZE) as source:
+                source.seek(offset)
+                for block in iter(lambda: source.read(DOWNLOAD_BLOCK_SIZE), b""):
+                    f.write(block)
+                    if md5:
+                        md5.update(block)
+
+    downloaded = os.path.getsize(target)
+    if downloaded != size:
+        raise IOError(f"Downloaded {downloaded} of the {size} bytes of {path}")
+    if md5 and md5.hexdigest() != etag:
+        # A corrupt download cannot be continued
+        os.remove(target)
+        raise IOError(f"The checksum of the download of {path} does not match")
+    return size
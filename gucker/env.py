@@ -16,3 +16,18 @@ def get_asset_file(file: str, darkMode: bool =False) -> str:
         str: The path
     """
     return os.path.join(ASSETS_PATH, file)
+
+
+def get_data_dir() -> str:
+    """Gets the directory Gucker keeps its local state in
+
+    Can be overwritten with the GUCKER_DATA_DIR environment variable.
+
+    Returns:
+        str: The path (created if it does not exist)
+    """
+    data_dir = os.environ.get(
+        "GUCKER_DATA_DIR", os.path.join(os.path.expanduser("~"), ".gucker")
+    )
+    os.makedirs(data_dir, exist_ok=True)
+    return data_dir
@@ -0,0 +1,608 @@
+"""Exporting
+
+The exporter writes stages, images and datasets from mikro into the export
+directory. Exports are split into independent tasks (one per representation,
+table or roi); tasks can spawn further tasks for the objects derived from them.
+Queries run as coroutines on the event loop, everything blocking (loading pixel
+data, downloads and writes) on a bounded thread pool. Progress is aggregated
+over all tasks of an export.
+
+Every export directory gets a manifest of the exported objects. In incremental
+mode, objects whose manifest entry is current are not fetched or written again.
+
+Stages are fetched in pages of positions, and the derived images of every
+image only once it is exported, so writing starts with the first page instead
+of after the whole stage graph was loaded. The next page is only fetched while
+few positions are still being exported, so a large stage is not loaded faster
+than it is written. Images reachable through several
+parents are written once per export and linked everywhere else.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set
+
+from slugify import slugify
+
+from gucker.datalayer import download_file
+from gucker.manifest import ExportManifest, marker_of
+from gucker.metrics import EXPORTED_BYTES, span
+from gucker.tables import TableFormat
+from gucker.uploader import retry
+
+if TYPE_CHECKING:
+    from mikro.api.schema import (
+        DatasetFragment,
+        RepresentationFragment,
+        ROIFragment,
+        StageFragment,
+        TableFragment,
+    )
+
+# The generated export queries (gucker.api.schema), mikro and the tiff writer
+# (tifffile, numpy) are slow to import, so they are only imported once an export runs.
+
+logger = logging.getLogger(__name__)
+
+
+class Pending:
+    """Counts the unfinished tasks of a position, including the tasks they spawned"""
+
+    def __init__(self, done: Callable[[], None]) -> None:
+        self.count = 0
+        self.done = done
+
+
+# The position the current task exports
+_position: contextvars.ContextVar[Optional[Pending]] = contextvars.ContextVar(
+    "position", default=None
+)
+
+
+class ExportProfile(str, Enum):
+    """How much of the graph around an image is exported
+
+    Lighter profiles use smaller queries, so the server does not traverse (and
+    the client does not decode) what would not be written anyway.
+    """
+
+    IMAGES = "images"
+    "Only the images (stages: without derived images)"
+    ROIS = "rois"
+    "The images and their ROIs (stages: with derived images)"
+    FULL = "full"
+    "Everything, including the images, tables and metrics derived from the ROIs"
+
+
+class ImageFormat(str, Enum):
+    """The file format of exported images"""
+
+    TIFF = "tiff"
+    "Decoded and written as (Big)TIFF"
+    ZARR = "zarr"
+    "The stored zarr copied without decoding (plain zarr, OME-NGFF only if stored in its order)"
+
+
+# The query fetching an image in each profile
+IMAGE_QUERIES = {
+    ExportProfile.IMAGES: "get_export_representation_images",
+    ExportProfile.ROIS: "get_export_representation_rois",
+    ExportProfile.FULL: "get_export_representation",
+}
+
+
+def write_json(path: str, model: Any) -> None:
+    """Writes a (pydantic) model as json"""
+    with open(path, "w") as f:
+        f.write(json.dumps(model.dict(), indent=4, sort_keys=True, default=str))
+
+
+def write_image(path: str, data: Any) -> None:
+    """Writes the data of a representation as tiff (measured as a span)"""
+    from gucker.tiff import write_tiff
+
+    with span("write_tiff", path=path):
+        write_tiff(path, data)
+    EXPORTED_BYTES.inc(os.path.getsize(path))
+
+
+def remove_path(path: str) -> None:
+    """Removes a file, link or directory"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def list_files(path: str) -> List[str]:
+    """The path of a file, or the paths of all files in a directory"""
+    if not os.path.isdir(path):
+        return [path]
+    return [os.path.join(root, file) for root, _, files in os.walk(path) for file in files]
+
+
+def link_file(source: str, target: str) -> None:
+    """Makes a file (or directory) available under another path
+
+    Creates a hardlink, or a relative symlink where hardlinks are not supported,
+    or copies the file if neither is.
+    """
+    if os.path.lexists(target):
+        remove_path(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        try:
+            os.symlink(os.path.relpath(source, os.path.dirname(target)), target)
+        except OSError:
+            if os.path.isdir(source):
+                shutil.copytree(source, target)
+            else:
+                shutil.copyfile(source, target)
+
+
+class Exporter:
+    """Exports mikro objects to a directory from within an event loop
+
+    Queries run as coroutines (the `aget_export_*` functions), so many of them
+    can be in flight without a thread each. Blocking tasks run on a bounded
+    thread pool and can spawn further tasks from their worker thread.
+
+    Args:
+        export_dir (str): The directory to export to
+        max_workers (int, optional): The number of concurrent blocking tasks. Defaults to 8.
+        max_requests (int, optional): The number of concurrent queries. Defaults to 64.
+        incremental (bool, optional): Skip objects that are unchanged since the last
+            export into the same directory. Defaults to False.
+        verify (bool, optional): In incremental mode, also verify the content hashes of
+            previously downloaded files before skipping them. Defaults to False.
+        page_size (int, optional): The number of positions fetched per request when
+            exporting a stage. Defaults to 20.
+        max_positions (int, optional): The number of positions exported at the same time;
+            the next page is only fetched while fewer are pending. Defaults to two pages.
+        profile (ExportProfile, optional): How much to export. Defaults to ExportProfile.FULL.
+        roi_format (TableFormat, optional): Write the vectors and the metadata of the rois
+            of an image as two tables in this format, or as a directory per roi for
+            TableFormat.CSV. Defaults to TableFormat.CSV.
+        table_format (TableFormat, optional): The format of exported tables. Defaults to
+            TableFormat.CSV.
+        image_format (ImageFormat, optional): The format of exported images. Defaults to
+            ImageFormat.TIFF.
+    """
+
+    def __init__(
+        self,
+        export_dir: str,
+        max_workers: int = 8,
+        max_requests: int = 64,
+        incremental: bool = False,
+        verify: bool = False,
+        page_size: int = 20,
+        max_positions: Optional[int] = None,
+        profile: ExportProfile = ExportProfile.FULL,
+        roi_format: TableFormat = TableFormat.CSV,
+        table_format: TableFormat = TableFormat.CSV,
+        image_format: ImageFormat = ImageFormat.TIFF,
+    ) -> None:
+        self.export_dir = export_dir
+        self.max_workers = max(1, max_workers)
+        self.max_requests = max(1, max_requests)
+        self.incremental = incremental
+        self.verify = verify
+        self.page_size = max(1, page_size)
+        self.max_positions = max(1, max_positions or 2 * self.page_size)
+        self.profile = ExportProfile(profile)
+        self.roi_format = TableFormat(roi_format)
+        self.table_format = TableFormat(table_format)
+        self.image_format = ImageFormat(image_format)
+        self.manifest: Optional[ExportManifest] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.requests: Optional[asyncio.Semaphore] = None
+        self.lock = threading.Lock()
+        self.tasks: Set[asyncio.Future] = set()
+        self.starting = 0
+        self.submitted = 0
+        # Set while an export shuts down, tasks submitted then are not started
+        self.closing = False
+        # Representation id -> the path its image is (being) written to in this run
+        self.images: Dict[str, Future] = {}
+
+    def submit(self, fn: Callable[..., Any], *args) -> None:
+        """Schedules an export task (thread safe, can be called from within other tasks)
+
+        Coroutine functions run on the event loop, all others on the thread pool.
+        Both run in a copy of the context of the caller.
+        """
+        position = _position.get()
+        with self.lock:
+            self.starting += 1
+            self.submitted += 1
+            if position:
+                position.count += 1
+        # call_soon_threadsafe runs the callback in a copy of the current context
+        self.loop.call_soon_threadsafe(self._start, fn, args)
+
+    def _start(self, fn: Callable[..., Any], args: tuple) -> None:
+        if not self.closing:
+            if asyncio.iscoroutinefunction(fn):
+                task = asyncio.ensure_future(fn(*args))
+            else:
+                context = contextvars.copy_context()
+                task = self.loop.run_in_executor(self.executor, context.run, fn, *args)
+            position = _position.get()
+            if position:
+                task.add_done_callback(lambda _: self._finished(position))
+            self.tasks.add(task)
+        with self.lock:
+            self.starting -= 1
+
+    def _finished(self, position: Pending) -> None:
+        with self.lock:
+            position.count -= 1
+            done = not position.count
+        if done:
+            position.done()
+
+    def _open_manifest(self, dir: str) -> None:
+        os.makedirs(dir, exist_ok=True)
+        self.manifest = ExportManifest(dir)
+
+    async def aquery(self, name: str, *args, **kwargs) -> Any:
+        """Runs the async variant of an export query (measured as a span)"""
+        from gucker.api import schema
+
+        async with self.requests:
+            with span("graphql", query=name):
+                return await getattr(schema, f"a{name}")(*args, **kwargs)
+
+    async def arun(self, fn: Callable[..., Any], *args) -> None:
+        """Runs an export task and all tasks it spawns, reporting the progress
+
+        Raises the first error of a task (pending tasks are cancelled).
+        """
+        from arkitekt import aprogress
+
+        self.loop = asyncio.get_running_loop()
+        self.requests = asyncio.Semaphore(self.max_requests)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="gucker-export"
+        )
+        self.images.clear()
+        try:
+            self.submit(fn, *args)
+            finished, reported = 0, 0
+            while True:
+                with self.lock:
+                    starting = self.starting
+                if not self.tasks:
+                    if not starting:
+                        break
+                    # The task was submitted, but its start is still scheduled
+                    await asyncio.sleep(0)
+                    continue
+
+                done, _ = await asyncio.wait(
+                    self.tasks, timeout=1, return_when=asyncio.FIRST_COMPLETED
+                )
+                self.tasks.difference_update(done)
+                # Retrieve the errors of all tasks, only the first one is raised
+                for task in done:
+                    if not task.cancelled():
+                        task.exception()
+                for task in done:
+                    task.result()
+
+                finished += len(done)
+                percent = int(100 * finished / self.submitted)
+                if percent > reported:
+                    await aprogress(percent)
+                    reported = percent
+        finally:
+            # Tasks still running in the pool can submit others, which are dropped
+            self.closing = True
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            self.tasks.clear()
+            await self.loop.run_in_executor(None, self.executor.shutdown)
+            while self.starting:
+                await asyncio.sleep(0)
+            self.closing = False
+            self.executor = None
+            if self.manifest:
+                await self.loop.run_in_executor(None, self.manifest.save)
+                self.manifest = None
+
+    def is_exported(self, kind: str, model: Any, dir: str) -> bool:
+        """Checks if an object is already exported (and unchanged) in incremental mode"""
+        if not self.incremental or not self.manifest:
+            return False
+        key = self.manifest.key(kind, model.id, dir)
+        return self.manifest.is_current(key, marker_of(model), verify=self.verify)
+
+    def mark_exported(
+        self, kind: str, model: Any, dir: str, *files: str, digests: bool = False
+    ) -> None:
+        """Records the files written for an object in the manifest"""
+        if self.manifest:
+            key = self.manifest.key(kind, model.id, dir)
+            self.manifest.record(key, marker_of(model), files, digests=digests)
+
+    def image_format_of(self, representation: "RepresentationFragment") -> ImageFormat:
+        """The format a representation is written in (zarr needs the stored zarr)"""
+        store = getattr(representation, "store", None)
+        if self.image_format == ImageFormat.ZARR and store is not None:
+            return ImageFormat.ZARR
+        return ImageFormat.TIFF
+
+    def write_representation(
+        self, representation: "RepresentationFragment", path: str
+    ) -> List[str]:
+        """Writes the image of a representation in the image format of the export
+
+        A representation reachable through several parents is only fetched and
+        written once per export, the other paths are linked to the first file.
+
+        Args:
+            representation (RepresentationFragment): The representation
+            path (str): The path without extension
+
+        Returns:
+            List[str]: The written files
+        """
+        zarr = self.image_format_of(representation) == ImageFormat.ZARR
+        path = f"{path}.zarr" if zarr else f"{path}.tiff"
+        with self.lock:
+            first = self.images.get(representation.id)
+            if first is None:
+                self.images[representation.id] = written = Future()
+
+        if first is not None:
+            try:
+                source = first.result()
+                if source != path:
+                    link_file(source, path)
+                return list_files(path)
+            except Exception:
+                pass
+
+        try:
+            files = self._write_image(representation, path, zarr)
+        except BaseException as e:
+            if first is None:
+                written.set_exception(e)
+            raise
+        if first is None:
+            written.set_result(path)
+        return files
+
+    def _write_image(
+        self, representation: "RepresentationFragment", path: str, zarr: bool
+    ) -> List[str]:
+        if not zarr:
+            write_image(path, representation.data)
+            return [path]
+
+        from gucker.ome_zarr import export_zarr
+
+        if os.path.lexists(path):
+            remove_path(path)
+        with span("copy_zarr", path=path):
+            files = export_zarr(representation, path)
+        EXPORTED_BYTES.inc(sum(os.path.getsize(file) for file in files))
+        return files
+
+    def export_representation(
+        self, representation: "RepresentationFragment", dir: str
+    ) -> None:
+        """Writes an image and its metadata into a directory"""
+        # The format is part of the key, so exporting in another format writes the image again
+        kind = f"representation.{self.image_format_of(representation).value}"
+        if self.is_exported(kind, representation, dir):
+            return
+
+        image_path = os.path.join(dir, f"ID({representation.id}) {representation.name}")
+        meta_path = os.path.join(dir, f"ID({representation.id}) {representation.name} meta.json")
+        files = self.write_representation(representation, image_path)
+        write_json(meta_path, representation)
+        self.mark_exported(kind, representation, dir, *files, meta_path)
+
+    def _export_position(self, item: Any, stage_dir: str) -> None:
+        pos_dir = os.path.join(stage_dir, f"ID({item.id}) {item.name}")
+        os.makedirs(pos_dir, exist_ok=True)
+        write_json(os.path.join(pos_dir, "position.json"), item)
+
+        for image in item.omeros:
+            representation = image.representation
+            image_dir = os.path.join(
+                pos_dir,
+                f"ID({representation.id}) {representation.name} {image.acquisition_date}",
+            )
+            os.makedirs(image_dir, exist_ok=True)
+            write_json(os.path.join(image_dir, "raw.json"), image)
+            self.submit(self.export_representation, representation, image_dir)
+            if self.profile != ExportProfile.IMAGES:
+                self.submit(self._export_derived, representation, image_dir)
+
+    async def _export_derived(self, representation: Any, image_dir: str) -> None:
+        export_derived = await self.aquery("get_export_derived", representation.id)
+        for file in export_derived.derived or []:
+            self.submit(self.export_representation, file, image_dir)
+
+    async def _export_positions(self, stage_id: str, stage_dir: str) -> None:
+        # A position is pending until all tasks it spawned are done
+        pending = asyncio.Semaphore(self.max_positions)
+        offset = 0
+        while True:
+            positions = await self.aquery(
+                "get_export_positions", stage_id, limit=self.page_size, offset=offset
+            )
+            for item in positions or []:
+                await pending.acquire()
+                context = contextvars.copy_context()
+                context.run(_position.set, Pending(pending.release))
+                context.run(self.submit, self._export_position, item, stage_dir)
+            if len(positions or []) < self.page_size:
+                break
+            offset += self.page_size
+
+    async def _export_stage(self, stage: "StageFragment") -> None:
+        export_stage = await self.aquery("get_export_stage_info", stage)
+        stage_dir = os.path.join(self.export_dir, slugify(f"ID({stage.id}) {export_stage.name}"))
+        await self.loop.run_in_executor(None, self._open_manifest, stage_dir)
+        await self._export_positions(export_stage.id, stage_dir)
+
+    async def aexport_stage(self, stage: "StageFragment") -> None:
+        """Exports a stage with all its positions and images"""
+        await self.arun(self._export_stage, stage)
+
+    def export_derived_table(self, table: "TableFragment", dir: str) -> None:
+        """Writes a table and its metadata into a directory"""
+        # The format is part of the key, so exporting in another format writes the table again
+        kind = f"table.{self.table_format.value}"
+        if self.is_exported(kind, table, dir):
+            return
+
+        if self.table_format == TableFormat.CSV:
+            table_path = os.path.join(dir, "table.csv")
+            table.data.to_csv(table_path)
+        else:
+            from gucker.tables import export_table
+
+            table_path = export_table(table, os.path.join(dir, "table"), self.table_format)
+        EXPORTED_BYTES.inc(os.path.getsize(table_path))
+        write_json(os.path.join(dir, "meta.json"), table)
+        self.mark_exported(kind, table, dir, table_path, os.path.join(dir, "meta.json"))
+
+    def export_derived_roi(self, roi: "ROIFragment", dir: str) -> None:
+        """Writes the vectors and the metadata of a roi into a directory"""
+        if not self.is_exported("roi", roi, dir):
+            vector = roi.get_vector_pandas()
+            vector.to_csv(os.path.join(dir, "vector.csv"))
+            write_json(os.path.join(dir, "meta.json"), roi)
+            self.mark_exported(
+                "roi", roi, dir, os.path.join(dir, "vector.csv"), os.path.join(dir, "meta.json")
+            )
+        self._export_roi_derived(roi, dir)
+
+    def export_rois(self, representation: "RepresentationFragment", dir: str) -> None:
+        """Writes the vectors and the metadata of all rois of a representation as two tables"""
+        rois = [roi for roi in representation.rois or () if roi is not None]
+        kind = f"rois.{self.roi_format.value}"
+        if not self.is_exported(kind, representation, dir):
+            from gucker.tables import rois_frame, rois_meta_frame, write_frame
+
+            path = write_frame(rois_frame(rois), os.path.join(dir, "rois"), self.roi_format)
+            meta_path = write_frame(
+                rois_meta_frame(rois), os.path.join(dir, "rois_meta"), self.roi_format
+            )
+            self.mark_exported(kind, representation, dir, path, meta_path)
+
+        for roi in rois:
+            if getattr(roi, "derived_representations", None):
+                roi_dir = os.path.join(dir, slugify(f"ID({roi.id})"))
+                os.makedirs(roi_dir, exist_ok=True)
+                self._export_roi_derived(roi, roi_dir)
+
+    def _export_roi_derived(self, roi: "ROIFragment", dir: str) -> None:
+        if hasattr(roi, "derived_representations"):
+            derived_dir = os.path.join(dir, "derived_representations")
+            for derived_rep in roi.derived_representations:
+                image_dir = os.path.join(
+                    derived_dir,
+                    slugify(f"ID({derived_rep.id}) {derived_rep.name}"),
+                )
+                os.makedirs(image_dir, exist_ok=True)
+                self.submit(self.export_derived_representation, derived_rep, image_dir)
+
+    def export_derived_representation(
+        self, representation: "RepresentationFragment", dir: str
+    ) -> None:
+        """Writes an image into a directory and schedules everything derived from it"""
+        kind = f"representation.{self.image_format_of(representation).value}"
+        if not self.is_exported(kind, representation, dir):
+            files = self.write_representation(representation, os.path.join(dir, "image"))
+            write_json(os.path.join(dir, "meta.json"), representation)
+            self.mark_exported(kind, representation, dir, *files, os.path.join(dir, "meta.json"))
+
+        if hasattr(representation, "derived"):
+            derived_dir = os.path.join(dir, "derived")
+            for derived_rep in representation.derived:
+                image_dir = os.path.join(
+                    derived_dir,
+                    slugify(f"ID({derived_rep.id}) {derived_rep.name}"),
+                )
+                os.makedirs(image_dir, exist_ok=True)
+                self.submit(self.export_derived_representation, derived_rep, image_dir)
+
+        if hasattr(representation, "tables"):
+            derived_dir = os.path.join(dir, "tables")
+            for derived_table in representation.tables:
+                image_dir = os.path.join(
+                    derived_dir,
+                    slugify(f"ID({derived_table.id}) {derived_table.name}"),
+                )
+                os.makedirs(image_dir, exist_ok=True)
+                self.submit(self.export_derived_table, derived_table, image_dir)
+
+        if hasattr(representation, "rois") and self.roi_format != TableFormat.CSV:
+            derived_dir = os.path.join(dir, "rois")
+            os.makedirs(derived_dir, exist_ok=True)
+            self.submit(self.export_rois, representation, derived_dir)
+        elif hasattr(representation, "rois"):
+            derived_dir = os.path.join(dir, "rois")
+            for derived_roi in representation.rois:
+                image_dir = os.path.join(derived_dir, slugify(f"ID({derived_roi.id})"))
+                os.makedirs(image_dir, exist_ok=True)
+                self.submit(self.export_derived_roi, derived_roi, image_dir)
+
+    async def _export_image(self, representation: "RepresentationFragment") -> None:
+        export_rep = await self.aquery(IMAGE_QUERIES[self.profile], representation)
+        # Writing the image and walking its rois is blocking
+        self.submit(self._image_fetched, export_rep)
+
+    def _image_fetched(self, export_rep: Any) -> None:
+        image_dir = os.path.join(
+            self.export_dir, slugify(f"ID({export_rep.id}) {export_rep.name}")
+        )
+        self._open_manifest(image_dir)
+        self.export_derived_representation(export_rep, image_dir)
+
+    async def aexport_image(self, representation: "RepresentationFragment") -> None:
+        """Exports an image with its rois, tables and derived images"""
+        await self.arun(self._export_image, representation)
+
+    def _download_file(self, item: Any, export_dir: str) -> None:
+        if self.is_exported("file", item, export_dir):
+            return
+
+        # Partial downloads never take the place of the file, so an interrupted
+        # export leaves no truncated files behind that could be mistaken as complete.
+        # A retry (or the next export) continues the partial download.
+        path = os.path.join(export_dir, item.name)
+        part_path = path + ".part"
+        with span("download", path=path):
+            retry(lambda: download_file(item.file.value, part_path), f"Downloading {path}")
+        os.replace(part_path, path)
+        EXPORTED_BYTES.inc(os.path.getsize(path))
+        self.mark_exported("file", item, export_dir, path, digests=True)
+
+    async def _export_dataset(self, dataset: "DatasetFragment") -> None:
+        export_dataset = await self.aquery("get_export_dataset", dataset)
+        export_dir = os.path.join(
+            self.export_dir, f"ID({export_dataset.id}) {export_dataset.name}"
+        )
+        await self.loop.run_in_executor(None, self._open_manifest, export_dir)
+        for item in export_dataset.omerofiles:
+            self.submit(self._download_file, item, export_dir)
+
+    async def aexport_dataset(self, dataset: "DatasetFragment") -> None:
+        """Exports the original files of a dataset"""
+        await self.arun(self._export_dataset, dataset)
@@ -0,0 +1,204 @@
+"""Upload ledger
+
+The ledger remembers which files were uploaded to which dataset (by path,
+size and modification time) together with their content hash and the id of
+the resulting OmeroFile. It is stored in a SQLite database, so a restarted
+stream only uploads files that are new or changed since the last run into
+the same dataset, and files with the same content as an earlier upload can
+be found by their hash.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from gucker.env import get_data_dir
+
+HASH_BLOCK_SIZE = 4 * 1024**2
+
+
+def file_digest(path: str) -> str:
+    """Computes the content hash (blake2b) of a file
+
+    Args:
+        path (str): The path of the file
+
+    Returns:
+        str: The hex digest
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class LedgerEntry(NamedTuple):
+    """An uploaded file as recorded in the ledger"""
+    path: str
+    dataset: str
+    size: int
+    mtime: float
+    hash: Optional[str]
+    file_id: str
+    exact: bool
+    uploaded_at: float
+
+
+# Values of the columns missing in ledgers of older versions. Their entries are
+# kept, but match no dataset and are not offered as duplicates.
+MIGRATED_DEFAULTS = {"dataset": "''", "exact": "0"}
+
+
+class Ledger:
+    """A persistent record of uploaded files
+
+    The ledger can be shared between threads.
+
+    Args:
+        path (Optional[str], optional): The database file. Defaults to ledger.sqlite in
+            the gucker data directory.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or os.path.join(get_data_dir(), "ledger.sqlite")
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.connection:
+            columns = [
+                row[1] for row in self.connection.execute("PRAGMA table_info(uploads)")
+            ]
+            outdated = columns and not set(LedgerEntry._fields) <= set(columns)
+            if outdated:
+                self.connection.execute("ALTER TABLE uploads RENAME TO uploads_outdated")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "path TEXT, dataset TEXT, size INTEGER, mtime REAL, hash TEXT, "
+                "file_id TEXT, exact INTEGER, uploaded_at REAL, PRIMARY KEY (path, dataset))"
+            )
+            if outdated:
+                values = ", ".join(
+                    field if field in columns else MIGRATED_DEFAULTS[field]
+                    for field in LedgerEntry._fields
+                )
+                self.connection.execute(
+                    f"INSERT INTO uploads SELECT {values} FROM uploads_outdated"
+                )
+                self.connection.execute("DROP TABLE uploads_outdated")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS uploads_hash ON uploads (hash)"
+            )
+
+    def get(self, path: str, dataset: str) -> Optional[LedgerEntry]:
+        """Gets the entry of a file
+
+        Args:
+            path (str): The path of the file
+            dataset (str): The id of the dataset
+
+        Returns:
+            Optional[LedgerEntry]: The entry or None if the file was never uploaded
+                to the dataset
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM uploads WHERE path = ? AND dataset = ?",
+                (os.path.abspath(path), dataset),
+            ).fetchone()
+        return LedgerEntry(*row) if row else None
+
+    def find(self, hash: str, dataset: str) -> Optional[LedgerEntry]:
+        """Finds the latest upload of a content hash to a dataset
+
+        Only uploads whose OmeroFile holds exactly this content are found (not
+        files uploaded as part of an archive or transcoded before the upload).
+
+        Args:
+            hash (str): The content hash
+            dataset (str): The id of the dataset
+
+        Returns:
+            Optional[LedgerEntry]: The entry or None if no file with this content was uploaded
+                to the dataset
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM uploads WHERE hash = ? AND dataset = ? AND exact "
+                "ORDER BY uploaded_at DESC LIMIT 1",
+                (hash, dataset),
+            ).fetchone()
+        return LedgerEntry(*row) if row else None
+
+    def is_uploaded(self, path: str, dataset: str) -> bool:
+        """Checks if a file was uploaded to a dataset and has not changed since
+
+        Args:
+            path (str): The path of the file
+            dataset (str): The id of the dataset
+
+        Returns:
+            bool: True if the same file (size and modification time) was uploaded
+                to the dataset
+        """
+        entry = self.get(path, dataset)
+        if entry is None:
+            return False
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return entry.size == stat.st_size and entry.mtime == stat.st_mtime
+
+    def record(
+        self,
+        path: str,
+        dataset: str,
+        file_id: str,
+        hash: Optional[str] = None,
+        exact: bool = True,
+    ) -> LedgerEntry:
+        """Records the upload of a file
+
+        Args:
+            path (str): The path of the file
+            dataset (str): The id of the dataset the file was uploaded to
+            file_id (str): The id of the uploaded OmeroFile
+            hash (Optional[str], optional): The content hash. Computed if not provided.
+            exact (bool, optional): Whether the OmeroFile holds exactly the content of the
+                file (False if it was uploaded in an archive or transcoded). Defaults to True.
+
+        Returns:
+            LedgerEntry: The new entry
+        """
+        stat = os.stat(path)
+        entry = LedgerEntry(
+            path=os.path.abspath(path),
+            dataset=dataset,
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            hash=hash or file_digest(path),
+            file_id=file_id,
+            exact=exact,
+            uploaded_at=time.time(),
+        )
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?, ?, ?)", entry
+            )
+        return entry
+
+    def close(self) -> None:
+        """Closes the database"""
+        with self.lock:
+            self.connection.close()
+
+    def __enter__(self) -> "Ledger":
+        """Returns the ledger"""
+        return self
+
+    def __exit__(self, *args, **kwargs) -> None:
+        """Closes the ledger"""
+        self.close()
@@ -0,0 +1,133 @@
+"""Export manifests
+
+An export manifest is stored next to the exported files and records for every
+exported object the files that were written for it, their sizes and a marker
+of the object's state on the server (a hash of its fetched metadata, with
+stored files identified by their object path). A later
+export of the same object can then skip everything that neither changed on the
+server nor on disk.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from enum import Enum
+from typing import Any, Dict, Iterable
+
+from gucker.datalayer import object_path
+from gucker.ledger import file_digest
+
+MANIFEST_NAME = "gucker-manifest.json"
+
+
+def _stable(value: Any) -> Any:
+    # Stored files (mikro's File, Store and Parquet scalars) are fetched as presigned
+    # URLs whose query changes with every fetch, only their object path is stable
+    if isinstance(getattr(value, "value", None), str) and not isinstance(value, Enum):
+        return object_path(value.value)
+    if isinstance(value, dict):
+        return {key: _stable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_stable(item) for item in value]
+    return value
+
+
+def marker_of(model: Any) -> str:
+    """Computes the marker of a (pydantic) model from its content
+
+    The content are the fields of the model (e.g. its id, name, size or etag),
+    where stored files count by their object path and not by their URL.
+    """
+    content = json.dumps(_stable(model.dict()), sort_keys=True, default=str)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+class ExportManifest:
+    """The manifest of an export directory
+
+    The manifest can be shared between threads.
+
+    Args:
+        export_dir (str): The export directory (the manifest is stored inside it)
+    """
+
+    def __init__(self, export_dir: str) -> None:
+        self.export_dir = export_dir
+        self.path = os.path.join(export_dir, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f).get("entries", {})
+
+    def key(self, kind: str, id: str, dir: str) -> str:
+        """The key of an object exported into a directory"""
+        return f"{kind}:{id}:{os.path.relpath(dir, self.export_dir)}"
+
+    def is_current(self, key: str, marker: str, verify: bool = False) -> bool:
+        """Checks if an object is exported in the state described by the marker
+
+        Args:
+            key (str): The key of the object
+            marker (str): The current marker of the object
+            verify (bool, optional): Also compare the content hashes of the files
+                (if recorded). Defaults to False.
+
+        Returns:
+            bool: True if the marker matches and all its files exist with their recorded size
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+        if not entry or entry["marker"] != marker:
+            return False
+
+        for relpath, size in entry["files"].items():
+            try:
+                if os.path.getsize(os.path.join(self.export_dir, relpath)) != size:
+                    return False
+            except OSError:
+                return False
+
+        if verify:
+            for relpath, digest in entry.get("digests", {}).items():
+                if file_digest(os.path.join(self.export_dir, relpath)) != digest:
+                    return False
+        return True
+
+    def record(
+        self, key: str, marker: str, files: Iterable[str], digests: bool = False
+    ) -> None:
+        """Records the files written for an object
+
+        Args:
+            key (str): The key of the object
+            marker (str): The marker of the exported state
+            files (Iterable[str]): The paths of the written files
+            digests (bool, optional): Also record the content hashes of the files. Defaults to
+                False.
+        """
+        files = list(files)
+        entry = {
+            "marker": marker,
+            "exported_at": time.time(),
+            "files": {
+                os.path.relpath(file, self.export_dir): os.path.getsize(file) for file in files
+            },
+        }
+        if digests:
+            entry["digests"] = {
+                os.path.relpath(file, self.export_dir): file_digest(file) for file in files
+            }
+        with self.lock:
+            self.entries[key] = entry
+
+    def save(self) -> None:
+        """Writes the manifest (atomically)"""
+        with self.lock:
+            content = json.dumps({"version": 1, "entries": self.entries}, indent=2)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,270 @@
+"""Metrics and tracing
+
+A small, dependency free metrics registry for the upload and export hot
+paths. Metrics can be scraped in the Prometheus text format from a local
+HTTP endpoint (`start_http_server`), and every `span` is also logged as a
+structured record (use `JsonFormatter` to write the logs as json lines).
+Rates like bytes/s are derived by the scraper from the counters.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+# The level spans are logged at
+SPAN_LOG_LEVEL = logging.INFO
+
+LabelValues = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> LabelValues:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in pairs
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Metric:
+    """A metric with optional labels
+
+    Args:
+        name (str): The name of the metric
+        help (str): A description of the metric
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        """The samples of the metric in the Prometheus text format"""
+        raise NotImplementedError()
+
+    def render(self) -> str:
+        """The metric in the Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    """A value that only goes up"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str) -> None:
+        super().__init__(name, help)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increases the value"""
+        key = _labels(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        """The current value"""
+        with self.lock:
+            return self.values.get(_labels(labels), 0)
+
+    def samples(self) -> List[str]:
+        """The samples of the metric in the Prometheus text format"""
+        with self.lock:
+            values = dict(self.values)
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in values.items()]
+
+
+class Gauge(Counter):
+    """A value that goes up and down"""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """Sets the value"""
+        with self.lock:
+            self.values[_labels(labels)] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        """Decreases the value"""
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """The distribution of observed values (e.g. latencies) in buckets
+
+    Args:
+        buckets (Sequence[float], optional): The upper bounds of the buckets.
+            Defaults to DEFAULT_BUCKETS (seconds).
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help)
+        self.buckets = sorted(buckets)
+        # Labels -> (bucket counts, sum, count)
+        self.values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Records a value"""
+        key = _labels(labels)
+        with self.lock:
+            counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                counts[index] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels: str) -> int:
+        """The number of recorded values"""
+        with self.lock:
+            return self.values.get(_labels(labels), ([], 0.0, 0))[2]
+
+    def samples(self) -> List[str]:
+        """The samples of the metric in the Prometheus text format"""
+        with self.lock:
+            values = {key: (list(value[0]),) + value[1:] for key, value in self.values.items()}
+
+        lines = []
+        for key, (counts, total, count) in values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(key, ("le", str(bound)))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """A collection of metrics"""
+
+    def __init__(self) -> None:
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """Adds a metric to the registry"""
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format"""
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+FILES_DETECTED = REGISTRY.register(
+    Counter("gucker_files_detected_total", "Files detected in the watched folder")
+)
+UPLOAD_QUEUE = REGISTRY.register(Gauge("gucker_upload_queue", "Files waiting for an upload slot"))
+UPLOADED_BYTES = REGISTRY.register(Counter("gucker_uploaded_bytes_total", "Bytes uploaded"))
+EXPORTED_BYTES = REGISTRY.register(
+    Counter("gucker_exported_bytes_total", "Bytes written to the export directory")
+)
+FAILURES = REGISTRY.register(Counter("gucker_failures_total", "Failed operations by error type"))
+SPAN_SECONDS = REGISTRY.register(
+    Histogram("gucker_span_seconds", "Duration of uploads, downloads, queries and writes")
+)
+
+
+@contextmanager
+def span(name: str, **attributes: str) -> Iterator[Dict[str, str]]:
+    """Measures an operation
+
+    The duration is observed in `gucker_span_seconds` (labelled with the span
+    name), failures are counted by error type in `gucker_failures_total` and the
+    span is logged (at SPAN_LOG_LEVEL) with its attributes. Attributes added to
+    the yielded dict (e.g. the number of bytes) are logged as well. Cancellations
+    are not counted as failures.
+
+    Args:
+        name (str): The name of the operation (e.g. "upload_bigfile")
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except Exception as e:
+        error = type(e).__name__
+        FAILURES.inc(span=name, error=error)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        SPAN_SECONDS.observe(duration, span=name)
+        logger.log(
+            SPAN_LOG_LEVEL,
+            f"{name} took {duration:.3f}s",
+            extra={"span": name, "duration": duration, "error": error, **attributes},
+        )
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as json lines, including the attributes of spans"""
+
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Formats a record as a json line"""
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in self.RESERVED})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self) -> None:
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves the metrics on a daemon thread
+
+    Args:
+        port (int): The port (0 picks a free one)
+        host (str, optional): The interface to listen on. Defaults to "127.0.0.1".
+
+    Returns:
+        ThreadingHTTPServer: The server (call `shutdown` to stop it)
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="gucker-metrics", daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
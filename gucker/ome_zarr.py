@@ -0,0 +1,163 @@
+"""Zero-copy zarr export
+
+Mikro stores representations as zarr groups in the object store of the
+datalayer. Instead of decoding the pixels and encoding them again as TIFF,
+the store (metadata and compressed chunks) can be copied byte for byte into
+the export directory. The copy is then annotated with OME-NGFF `multiscales`
+metadata, so OME-Zarr readers find the image.
+
+The axes can only be declared in the order they are stored in, as reordering
+them would require rewriting the chunks. OME-NGFF 0.4 requires time, then
+channel, then space, so images stored in another order (like mikro's c, t,
+z, y, x) are exported as plain zarr without `multiscales`.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from gucker.datalayer import datalayer_fs
+
+logger = logging.getLogger(__name__)
+
+AXIS_TYPES = {"t": "time", "c": "channel", "z": "space", "y": "space", "x": "space"}
+AXIS_UNITS = {"t": "millisecond", "z": "micrometer", "y": "micrometer", "x": "micrometer"}
+# The order of the axis types in OME-NGFF 0.4
+AXIS_ORDER = {"time": 0, "channel": 1, "space": 2}
+
+
+def copy_store(store: Any, target_dir: str, fs: Optional[Any] = None) -> List[str]:
+    """Copies a zarr store without decoding it
+
+    Args:
+        store (Any): The Store scalar of a representation (its value is the path in the
+            object store)
+        target_dir (str): The directory to copy to
+        fs (Optional[Any], optional): The fsspec file system. Defaults to the one of the datalayer.
+
+    Returns:
+        List[str]: The written files
+    """
+    fs = fs or datalayer_fs()
+    source = fs._strip_protocol(store.value).rstrip("/")
+    keys = [key for key in fs.find(source) if not key.endswith("/")]
+    targets = [
+        os.path.join(target_dir, *key[len(source) :].lstrip("/").split("/")) for key in keys
+    ]
+    for directory in {os.path.dirname(target) for target in targets}:
+        os.makedirs(directory, exist_ok=True)
+    # A single batched get lets async file systems (s3fs) fetch the chunks concurrently
+    fs.get(keys, targets)
+    return targets
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def is_ngff_order(dims: Sequence[str]) -> bool:
+    """Checks if axes in this order can be declared in OME-NGFF 0.4
+
+    At most one time and one channel axis and two or three space axes, with time
+    before channel before space.
+    """
+    types = [AXIS_TYPES.get(dim, "space") for dim in dims]
+    return (
+        len(set(dims)) == len(dims)
+        and types.count("time") <= 1
+        and types.count("channel") <= 1
+        and 2 <= types.count("space") <= 3
+        and types == sorted(types, key=AXIS_ORDER.__getitem__)
+    )
+
+
+def write_ngff_metadata(
+    group_dir: str, name: str, physical_size: Optional[Any] = None
+) -> Optional[str]:
+    """Adds OME-NGFF multiscales metadata to a copied zarr group
+
+    Groups whose axes are not stored in an order OME-NGFF allows are left as
+    plain zarr.
+
+    Args:
+        group_dir (str): The zarr group
+        name (str): The name of the image
+        physical_size (Optional[Any], optional): The physical size of a pixel (x, y, z, t, c).
+            Defaults to None.
+
+    Returns:
+        Optional[str]: The written .zattrs (None if the group contains no array or its
+            axes are not in OME-NGFF order)
+    """
+    arrays = sorted(
+        entry
+        for entry in os.listdir(group_dir)
+        if os.path.exists(os.path.join(group_dir, entry, ".zarray"))
+    )
+    if not arrays:
+        return None
+
+    path = arrays[0]
+    dims = _read_json(os.path.join(group_dir, path, ".zattrs")).get("_ARRAY_DIMENSIONS")
+    if not dims:
+        return None
+    if not is_ngff_order(dims):
+        logger.warning(
+            f"Exporting {name} as plain zarr: its axes ({', '.join(dims)}) are not stored "
+            "in the order OME-NGFF requires (time, channel, space)"
+        )
+        return None
+
+    axes = []
+    for dim in dims:
+        axis = {"name": dim, "type": AXIS_TYPES.get(dim, "space")}
+        if dim in AXIS_UNITS:
+            axis["unit"] = AXIS_UNITS[dim]
+        axes.append(axis)
+    # Channels have no physical size
+    scale = [
+        1.0 if axis["type"] == "channel" else float(getattr(physical_size, dim, None) or 1)
+        for axis, dim in zip(axes, dims)
+    ]
+
+    attrs_path = os.path.join(group_dir, ".zattrs")
+    attrs = _read_json(attrs_path)
+    attrs["multiscales"] = [
+        {
+            "version": "0.4",
+            "name": name,
+            "axes": axes,
+            "datasets": [
+                {"path": path, "coordinateTransformations": [{"type": "scale", "scale": scale}]}
+            ],
+        }
+    ]
+    with open(attrs_path, "w") as f:
+        json.dump(attrs, f, indent=2)
+    return attrs_path
+
+
+def export_zarr(representation: Any, target_dir: str, fs: Optional[Any] = None) -> List[str]:
+    """Exports a representation as OME-Zarr by copying its store
+
+    Args:
+        representation (Any): The representation (with its store)
+        target_dir (str): The zarr directory to write
+        fs (Optional[Any], optional): The fsspec file system. Defaults to the one of the datalayer.
+
+    Returns:
+        List[str]: The written files
+    """
+    files = copy_store(representation.store, target_dir, fs=fs)
+    omero = getattr(representation, "omero", None)
+    attrs = write_ngff_metadata(
+        target_dir,
+        representation.name or str(representation.id),
+        getattr(omero, "physical_size", None),
+    )
+    if attrs and attrs not in files:
+        files.append(attrs)
+    return files
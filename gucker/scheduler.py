@@ -0,0 +1,108 @@
+"""Upload scheduling
+
+Streaming runs next to the acquisition and must not saturate the network the
+microscope depends on. Uploads are admitted through a token bucket whose rate
+can follow a time-of-day schedule, e.g.
+
+    08:00-20:00=20;20:00-08:00=0
+
+limits uploads to 20 MB/s during the day and lifts the limit at night (a rate of
+0 means unlimited). As a single upload cannot be throttled once it started,
+the limit applies to the average rate: a file is admitted when the bucket is
+not in debt and its size is then taken from the bucket.
+"""
+import datetime
+import re
+import threading
+import time
+from typing import List, Tuple
+
+_WINDOW = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})=([\d.]+)$")
+
+
+def parse_schedule(schedule: str) -> List[Tuple[int, int, float]]:
+    """Parses a bandwidth schedule
+
+    Args:
+        schedule (str): Windows like "08:00-20:00=20" (MB/s) separated by ";"
+
+    Returns:
+        List[Tuple[int, int, float]]: Start and end minute of the day and the rate in bytes/s
+    """
+    windows = []
+    for window in filter(None, (w.strip() for w in schedule.split(";"))):
+        match = _WINDOW.match(window)
+        if not match:
+            raise ValueError(f"Invalid schedule window {window}. Expected HH:MM-HH:MM=MB/s")
+        start_h, start_m, end_h, end_m, rate = match.groups()
+        windows.append(
+            (
+                int(start_h) * 60 + int(start_m),
+                int(end_h) * 60 + int(end_m),
+                float(rate) * 1024**2,
+            )
+        )
+    return windows
+
+
+class BandwidthLimiter:
+    """A token bucket limiting the average upload rate
+
+    Args:
+        rate (float, optional): The rate in bytes/s outside of scheduled windows
+            (0 is unlimited). Defaults to 0.
+        schedule (str, optional): A time-of-day schedule (see module documentation).
+            Defaults to "".
+        burst (float, optional): How many seconds of unused rate can be saved up. Defaults to 1.
+    """
+
+    def __init__(self, rate: float = 0, schedule: str = "", burst: float = 1) -> None:
+        self.default_rate = rate
+        self.schedule = parse_schedule(schedule)
+        self.burst = burst
+
+        self.lock = threading.Lock()
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+    def rate_at(self, now: datetime.datetime) -> float:
+        """The rate (bytes/s, 0 is unlimited) at a time of day"""
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            if start <= minute < end or (end < start and (minute >= start or minute < end)):
+                return rate
+        return self.default_rate
+
+    def _refill(self) -> float:
+        rate = self.rate_at(datetime.datetime.now())
+        now = time.monotonic()
+        if rate:
+            self.tokens = min(self.tokens + (now - self.updated) * rate, rate * self.burst)
+        self.updated = now
+        return rate
+
+    def acquire(self, size: int) -> bool:
+        """Takes the tokens for an upload if the bucket is not in debt
+
+        Args:
+            size (int): The size of the upload in bytes
+
+        Returns:
+            bool: True if the upload may start
+        """
+        with self.lock:
+            if not self._refill():
+                self.tokens = 0.0
+                return True
+            if self.tokens < 0:
+                return False
+            self.tokens -= size
+            return True
+
+    def delay(self) -> float:
+        """Seconds until the next upload may start"""
+        with self.lock:
+            rate = self._refill()
+            if not rate or self.tokens >= 0:
+                return 0
+            return -self.tokens / rate
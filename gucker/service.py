@@ -0,0 +1,464 @@
+"""The Gucker service
+
+The service holds the streaming and export functionality of Gucker
+independent of any user interface. The Qt window and the headless
+`gucker serve` command both register the functions of a service with
+rekuest.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from arkitekt import log
+from koil.vars import check_cancelled
+from mikro.api.schema import (
+    DatasetFragment,
+    OmeroFileFragment,
+    RepresentationFragment,
+    StageFragment,
+    create_dataset,
+    get_omero_file,
+    upload_bigfile,
+)
+
+from gucker.batching import Batcher, write_archive
+from gucker.datalayer import upload_large_file
+from gucker.env import get_data_dir
+from gucker.export import Exporter, ExportProfile, ImageFormat
+from gucker.ledger import Ledger, file_digest
+from gucker.metrics import FILES_DETECTED, UPLOAD_QUEUE, UPLOADED_BYTES, span
+from gucker.scheduler import BandwidthLimiter
+from gucker.stability import StabilityTracker
+from gucker.tables import TableFormat
+from gucker.transcode import Transcoder
+from gucker.uploader import UploadPool, retry
+from gucker.watcher import PathFilter, get_watcher
+
+logger = logging.getLogger(__name__)
+
+
+def _ignore(value: Any) -> None:
+    pass
+
+
+class Settings(dict):
+    """Plain settings with the `value` interface of QSettings"""
+
+    def value(self, key: str, default: Any = None) -> Any:
+        """The value of a setting, or the default if it is not set"""
+        return self.get(key, default)
+
+
+class GuckerService:
+    """Streams files to and exports objects from mikro
+
+    Args:
+        base_dir (str, optional): The directory to stream files from. Defaults to "".
+        export_dir (str, optional): The directory to export to. Defaults to "".
+        settings (Optional[Any], optional): The settings (anything with a QSettings like
+            `value(key, default)` method). Defaults to empty settings.
+    """
+
+    def __init__(
+        self, base_dir: str = "", export_dir: str = "", settings: Optional[Any] = None
+    ) -> None:
+        self.base_dir = base_dir
+        self.export_dir = export_dir
+        self.settings = settings if settings is not None else Settings()
+
+        self.on_watching: Callable[[bool], None] = _ignore
+        self.on_uploading: Callable[[str], None] = _ignore
+        self.on_uploaded: Callable[[str], None] = _ignore
+
+    def register(self, rekuest: Any) -> None:
+        """Registers the functions of the service with rekuest
+
+        Args:
+            rekuest (Any): The rekuest client of an arkitekt app
+        """
+        rekuest.register()(self.stream_files)
+        rekuest.register()(self.export_stage)
+        rekuest.register()(self.export_image)
+        rekuest.register()(self.export_dataset)
+
+    def stream_files(
+        self,
+        dataset: Optional[DatasetFragment],
+        regexp: Optional[str],
+        indefinitely: bool = False,
+        recursive: bool = False,
+        exclude: Optional[str] = None,
+        concurrency: int = 4,
+        ordered: bool = True,
+        done_marker: Optional[str] = None,
+        batch_threshold_kb: int = 0,
+        compress: Optional[str] = None,
+        deduplicate: bool = False,
+    ) -> OmeroFileFragment:
+        """Stream Files
+
+        Streams files from a folder to Mikro
+
+        Args:
+            dataset (Optional[DatasetFragment]): The Dataset to stream to
+            regexp (Optional[str]): A regular expression to filter the files (matched against the
+                path relative to the folder)
+            indefinitely (bool, optional): Should we stream waiting for new files?. Defaults to
+                False.
+            recursive (bool, optional): Should we also stream files from subfolders?. Defaults to
+                False.
+            exclude (Optional[str], optional): A regular expression for files and subfolders to
+                skip. Defaults to None.
+            concurrency (int, optional): How many files should be uploaded at the same time?.
+                Defaults to 4.
+            ordered (bool, optional): Return the files in the order they appeared (instead of the
+                order they finished uploading)?. Defaults to True.
+            done_marker (Optional[str], optional): Only upload a file once a marker file with this
+                suffix (e.g. ".done") exists next to it. Without indefinitely, files whose marker
+                is missing once everything else is uploaded are skipped. Defaults to None (upload
+                once the file stopped changing).
+            batch_threshold_kb (int, optional): Pack files smaller than this (in KB) that arrive
+                together into one zip archive (with an index.json) per upload. Defaults to 0 (no
+                batching).
+            compress (Optional[str], optional): Losslessly recompress matching TIFFs before
+                uploading, as "pattern=codec" rules separated by ";" (e.g. ".*\\.tif=zlib").
+                Defaults to None.
+            deduplicate (bool, optional): Return the earlier upload instead of uploading a file
+                whose content was already uploaded to the dataset. Defaults to False.
+
+        Raises:
+            ValueError: If no directory to watch is selected
+
+        Returns:
+            OmeroFileFragment: The uploaded file
+
+        Yields:
+            Iterator[OmeroFileFragment]: The uploaded file
+        """ """"""
+
+        if not self.base_dir:
+            raise ValueError("No directory to watch selected")
+
+        if not dataset:
+            dataset = create_dataset("Streaming Dataset")
+        # Files are only skipped if they were uploaded to this dataset before
+        dataset_id = str(dataset.id)
+
+        datadir = os.path.join(self.base_dir)
+
+        log(f"Streaming files of {datadir}")
+        self.on_watching(True)
+
+        submitted_files = set()
+        tracker = StabilityTracker(
+            grace_period=float(self.settings.value("grace_period", 2)),
+            marker_suffix=done_marker,
+        )
+
+        batcher = Batcher(
+            threshold=batch_threshold_kb * 1024,
+            window=float(self.settings.value("batch_window", 2)),
+            max_bytes=int(self.settings.value("batch_max_mb", 64)) * 1024**2,
+        )
+        staging_dir = os.path.join(get_data_dir(), "staging")
+        os.makedirs(staging_dir, exist_ok=True)
+        # Staged file (archive or transcoded file) -> the files it was made from
+        staged: Dict[str, List[str]] = {}
+
+        # Content hash -> lock, so copies of a file arriving together are uploaded once
+        hash_locks: Dict[str, threading.Lock] = {}
+        hash_locks_lock = threading.Lock()
+
+        retries = int(self.settings.value("upload_retries", 3))
+        # Files larger than a part are uploaded in resumable parts (0 disables this)
+        part_size = int(self.settings.value("upload_part_mb", 16)) * 1024**2
+        part_concurrency = int(self.settings.value("upload_part_concurrency", 4))
+
+        def send(file_path: str, size: int) -> OmeroFileFragment:
+            if part_size and size > part_size:
+                return upload_large_file(
+                    file_path, [dataset_id], part_size=part_size, max_workers=part_concurrency
+                )
+            return upload_bigfile(file=file_path, datasets=[dataset_id])
+
+        def upload_file(file_path: str) -> Optional[OmeroFileFragment]:
+            # A file can vanish while it is queued, it is then skipped
+            try:
+                size = os.path.getsize(file_path)
+            except OSError as e:
+                logger.warning(f"Skipping the upload of {file_path} ({e})")
+                return None
+
+            # Only the transfer is retried, not the bookkeeping around it
+            with span("upload_bigfile", path=file_path, bytes=size):
+                file = retry(
+                    lambda: send(file_path, size), f"Uploading {file_path}", retries=retries
+                )
+            UPLOADED_BYTES.inc(size)
+            return file
+
+        def record(file_path: str, file_id: str, **kwargs: Any) -> None:
+            # An uploaded file can already be gone (e.g. moved away by the acquisition
+            # software). It is then uploaded again in a later stream, but not now.
+            try:
+                ledger.record(file_path, dataset_id, file_id, **kwargs)
+            except OSError as e:
+                logger.warning(f"Could not record the upload of {file_path} ({e})")
+
+        def find_duplicate(hash: str) -> Optional[OmeroFileFragment]:
+            entry = ledger.find(hash, dataset_id)
+            if entry is None:
+                return None
+            try:
+                with span("graphql", query="get_omero_file"):
+                    return get_omero_file(entry.file_id)
+            except Exception as e:
+                logger.warning(f"Could not get earlier upload {entry.file_id} ({e})")
+                return None
+
+        def upload_unique(file_path: str) -> Optional[OmeroFileFragment]:
+            try:
+                hash = file_digest(file_path)
+            except OSError as e:
+                logger.warning(f"Skipping the upload of {file_path} ({e})")
+                return None
+            with hash_locks_lock:
+                lock = hash_locks.setdefault(hash, threading.Lock())
+            with lock:
+                file = find_duplicate(hash)
+                if file is not None:
+                    log(f"{file_path} was already uploaded as {file.id}")
+                else:
+                    file = upload_file(file_path)
+                if file is not None:
+                    record(file_path, file.id, hash=hash)
+            return file
+
+        def upload(file_path: str) -> Optional[OmeroFileFragment]:
+            if deduplicate and file_path not in staged:
+                return upload_unique(file_path)
+
+            file = upload_file(file_path)
+            originals = staged.pop(file_path, None)
+            if file is None:
+                return None
+            if originals is None:
+                record(file_path, file.id)
+                return file
+
+            for original in originals:
+                record(original, file.id, exact=False)
+            try:
+                os.remove(file_path)
+                if os.path.dirname(file_path) != staging_dir:
+                    os.rmdir(os.path.dirname(file_path))
+            except OSError as e:
+                logger.warning(f"Could not remove the staged file {file_path} ({e})")
+            return file
+
+        def submit_batch(members: List[str]) -> None:
+            archive_path = os.path.join(staging_dir, f"batch-{time.time_ns()}.zip")
+            write_archive(members, datadir, archive_path)
+            staged[archive_path] = members
+            if pool.submit(archive_path):
+                self.on_uploading(f"{len(members)} files")
+
+        # Small files (metadata, sidecars, batches) are uploaded before large raw data
+        priority_threshold = int(self.settings.value("priority_threshold_kb", 1024)) * 1024
+
+        def priority(file_path: str, size: int) -> int:
+            return 0 if size < priority_threshold else 1
+
+        limiter = BandwidthLimiter(
+            rate=float(self.settings.value("max_upload_rate", 0)) * 1024**2,
+            schedule=self.settings.value("upload_schedule", ""),
+        )
+
+        def is_new(file_path: str) -> bool:
+            if file_path in submitted_files:
+                return False
+            if ledger.is_uploaded(file_path, dataset_id):
+                submitted_files.add(file_path)
+                return False
+            FILES_DETECTED.inc()
+            return True
+
+        with Ledger() as ledger, get_watcher(
+            datadir,
+            filter=PathFilter(include=regexp, exclude=exclude),
+            recursive=recursive,
+            backend=self.settings.value("watcher", "auto"),
+        ) as watcher, UploadPool(
+            upload,
+            max_workers=concurrency,
+            max_inflight_bytes=int(self.settings.value("max_inflight_mb", 2048))
+            * 1024**2,
+            ordered=ordered,
+            priority=priority,
+            limiter=limiter,
+        ) as pool, Transcoder(compress or "", staging_dir) as transcoder:
+            for file_path in watcher.scan():
+                if is_new(file_path):
+                    tracker.add(file_path)
+
+            while True:
+                for file_path in tracker.ready():
+                    submitted_files.add(file_path)
+                    codec = transcoder.codec_for(watcher.relpath(file_path))
+                    if batcher.accepts(file_path):
+                        batcher.add(file_path)
+                    elif codec:
+                        transcoder.submit(file_path, codec)
+                    elif pool.submit(file_path):
+                        self.on_uploading(file_path)
+
+                for file_path, upload_path in transcoder.done():
+                    if upload_path != file_path:
+                        staged[upload_path] = [file_path]
+                    if pool.submit(upload_path):
+                        self.on_uploading(file_path)
+
+                # One-shot streams do not wait for markers that may never be written
+                awaiting = 0 if indefinitely else len(tracker.awaiting_marker)
+
+                # Without new files to wait for, the last batch is not held back
+                batch = batcher.take(force=not indefinitely and tracker.pending == awaiting)
+                if batch:
+                    submit_batch(batch)
+
+                # While uploads are running, we wake up as soon as one of them finishes
+                timeout = min(tracker.timeout(1), batcher.timeout(1))
+                if transcoder.pending:
+                    timeout = min(timeout, 0.1)
+                for file_path, file in pool.collect(timeout=0 if pool.idle else timeout):
+                    self.on_uploaded(file_path)
+                    if file is not None:
+                        yield file
+                UPLOAD_QUEUE.set(len(pool.backlog))
+
+                for file_path in watcher.poll(timeout=timeout if pool.idle else 0):
+                    if is_new(file_path):
+                        tracker.add(file_path)
+                for file_path in watcher.closed():
+                    tracker.mark_closed(file_path)
+
+                if (
+                    tracker.pending == awaiting
+                    and not batcher.pending
+                    and not transcoder.pending
+                    and pool.idle
+                ):
+                    if not indefinitely:
+                        if awaiting:
+                            logger.warning(
+                                f"Not uploading {awaiting} files without a {done_marker} marker"
+                            )
+                        break
+
+                check_cancelled()
+
+        self.on_watching(False)
+
+    def get_exporter(
+        self,
+        incremental: bool = False,
+        verify: bool = False,
+        profile: ExportProfile = ExportProfile.FULL,
+        roi_format: TableFormat = TableFormat.CSV,
+        table_format: TableFormat = TableFormat.CSV,
+        image_format: ImageFormat = ImageFormat.TIFF,
+    ) -> Exporter:
+        """Creates an exporter into the export directory with the settings"""
+        assert self.export_dir, "No export directory selected"
+        return Exporter(
+            self.export_dir,
+            max_workers=int(self.settings.value("export_concurrency", 8)),
+            max_requests=int(self.settings.value("export_requests", 64)),
+            incremental=incremental,
+            verify=verify,
+            page_size=int(self.settings.value("export_page_size", 20)),
+            max_positions=int(self.settings.value("export_max_positions", 0)) or None,
+            profile=profile,
+            roi_format=roi_format,
+            table_format=table_format,
+            image_format=image_format,
+        )
+
+    async def export_stage(
+        self,
+        stage: StageFragment,
+        incremental: bool = True,
+        profile: ExportProfile = ExportProfile.FULL,
+        image_format: ImageFormat = ImageFormat.TIFF,
+    ) -> None:
+        """Export Stage
+
+        Exports the stage to the export directory
+
+        Args:
+            stage (Stage): The stage to export
+            incremental (bool, optional): Skip everything that is unchanged since the last export.
+                Defaults to True.
+            profile (ExportProfile, optional): Export only the images ("images") or also the derived
+                images ("rois", "full"). Defaults to "full".
+            image_format (ImageFormat, optional): Write the images as "tiff" or copy their zarr
+                stores as they are ("zarr"). Mikro stores images as c, t, z, y, x, which OME-NGFF
+                does not allow, so these are plain zarr without OME metadata. Defaults to "tiff".
+        """
+        await self.get_exporter(
+            incremental, profile=profile, image_format=image_format
+        ).aexport_stage(stage)
+
+    async def export_image(
+        self,
+        representaion: RepresentationFragment,
+        incremental: bool = True,
+        profile: ExportProfile = ExportProfile.FULL,
+        roi_format: TableFormat = TableFormat.CSV,
+        table_format: TableFormat = TableFormat.CSV,
+        image_format: ImageFormat = ImageFormat.TIFF,
+    ) -> None:
+        """Export Image
+
+        Exports the Image and correspondings rois and their transformations to the export directory
+
+        Args:
+            stage (Stage): The stage to export
+            incremental (bool, optional): Skip everything that is unchanged since the last export.
+                Defaults to True.
+            profile (ExportProfile, optional): Export only the image ("images"), the image and its
+                rois ("rois") or also everything derived from the rois ("full"). Defaults to "full".
+            roi_format (TableFormat, optional): Write the vectors and the metadata of all rois as
+                two "parquet" or "feather" tables instead of a directory per roi ("csv"). Defaults
+                to "csv".
+            table_format (TableFormat, optional): Export tables as "csv", "parquet" (copied as
+                stored) or "feather". Defaults to "csv".
+            image_format (ImageFormat, optional): Write the images as "tiff" or copy their zarr
+                stores as they are ("zarr"). Mikro stores images as c, t, z, y, x, which OME-NGFF
+                does not allow, so these are plain zarr without OME metadata. Defaults to "tiff".
+        """
+        await self.get_exporter(
+            incremental,
+            profile=profile,
+            roi_format=roi_format,
+            table_format=table_format,
+            image_format=image_format,
+        ).aexport_image(representaion)
+
+    async def export_dataset(
+        self, dataset: DatasetFragment, incremental: bool = True, verify: bool = False
+    ) -> None:
+        """Export Files in Dataset
+
+        Exports the files of a dataset to the export directory
+        (does not include images but only original files))
+
+        Args:
+            stage (Stage): The stage to export
+            incremental (bool, optional): Skip files that were already downloaded. Defaults to True.
+            verify (bool, optional): Verify the checksums of already downloaded files before
+                skipping them. Defaults to False.
+        """
+        await self.get_exporter(incremental, verify).aexport_dataset(dataset)
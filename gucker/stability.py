@@ -0,0 +1,122 @@
+"""File stability detection
+
+Acquisition software writes files over seconds or minutes, so a file must
+only be uploaded once it is complete. A file counts as complete when
+
+- its "done" marker (e.g. `image.tif.done`) exists, if markers are used, or
+- it was closed after writing (close-write events of the native watcher), or
+- its size and modification time did not change for the grace period.
+"""
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Set
+
+
+class _Observation(NamedTuple):
+    size: int
+    mtime: int
+    since: float
+
+
+class StabilityTracker:
+    """Tracks files until they are completely written
+
+    Args:
+        grace_period (float, optional): Seconds a file must stay unchanged. Defaults to 2.
+        marker_suffix (Optional[str], optional): If set, a file is only complete once a
+            marker file with this suffix exists next to it (e.g. ".done"). Marker
+            files themselves are never reported. Defaults to None.
+    """
+
+    def __init__(self, grace_period: float = 2, marker_suffix: Optional[str] = None) -> None:
+        self.grace_period = grace_period
+        self.marker_suffix = marker_suffix
+        self.observations: Dict[str, Optional[_Observation]] = {}
+        self.closed: Set[str] = set()
+
+    @property
+    def pending(self) -> int:
+        """The number of files waiting to become complete"""
+        return len(self.observations)
+
+    @property
+    def awaiting_marker(self) -> List[str]:
+        """The files that are written but whose marker does not exist yet"""
+        return list(self.observations) if self.marker_suffix else []
+
+    def add(self, path: str) -> None:
+        """Starts tracking a file (tracking the same file twice is a no-op)"""
+        if self.marker_suffix and path.endswith(self.marker_suffix):
+            return
+        self.observations.setdefault(path, None)
+
+    def mark_closed(self, path: str) -> None:
+        """Marks a file as closed after writing"""
+        self.closed.add(path)
+
+    def _observe(self, path: str, now: float) -> Optional[_Observation]:
+        stat = os.stat(path)
+        observation = self.observations[path]
+        if (
+            observation is None
+            or observation.size != stat.st_size
+            or observation.mtime != stat.st_mtime_ns
+        ):
+            observation = _Observation(stat.st_size, stat.st_mtime_ns, now)
+            self.observations[path] = observation
+        return observation
+
+    def _is_complete(self, path: str, now: float) -> bool:
+        if self.marker_suffix:
+            # Raises for files that disappeared, so they are dropped as well
+            os.stat(path)
+            return os.path.exists(path + self.marker_suffix)
+        if path in self.closed:
+            return True
+        return now - self._observe(path, now).since >= self.grace_period
+
+    def ready(self) -> List[str]:
+        """Returns the files that are complete and stops tracking them
+
+        Files that disappeared are dropped.
+
+        Returns:
+            List[str]: The paths of the complete files
+        """
+        now = time.monotonic()
+        ready = []
+        for path in list(self.observations):
+            try:
+                complete = self._is_complete(path, now)
+            except OSError:
+                complete = False
+                del self.observations[path]
+
+            if complete:
+                del self.observations[path]
+                ready.append(path)
+
+        self.closed.intersection_update(self.observations)
+        return ready
+
+    def timeout(self, default: float = 1) -> float:
+        """How long to wait before checking the pending files again
+
+        Args:
+            default (float, optional): The timeout if no file is pending. Defaults to 1.
+
+        Returns:
+            float: The timeout in seconds
+        """
+        if not self.observations or self.marker_suffix:
+            return default
+
+        now = time.monotonic()
+        remaining = [
+            self.grace_period - (now - observation.since)
+            for observation in self.observations.values()
+            if observation is not None
+        ]
+        if len(remaining) < len(self.observations):
+            return 0
+        return min(default, max(0.05, min(remaining)))
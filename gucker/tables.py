@@ -0,0 +1,182 @@
+"""Columnar tables
+
+Instead of a directory with a csv and a json file per ROI, the ROIs of an
+image can be exported as two tables: the vectors with a row per vector, and
+the metadata of the ROIs (what the json files hold) with a row per ROI. Tables
+are written as Parquet or Feather, which need pyarrow; without it they fall
+back to csv.
+
+Mikro stores tables as Parquet, so exporting a table as Parquet copies the
+stored file and Feather is converted from it row group by row group, both
+without loading the whole table.
+"""
+import importlib.util
+import json
+import logging
+import os
+import shutil
+from enum import Enum
+from typing import Any, Iterable
+
+from gucker.datalayer import datalayer_fs
+
+logger = logging.getLogger(__name__)
+
+VECTOR_COLUMNS = ["x", "y", "z", "t", "c"]
+# Fields of a ROI that are not part of its metadata table
+ROI_META_EXCLUDE = {"vectors", "derived_representations"}
+COPY_BLOCK_SIZE = 8 * 1024**2
+
+
+class TableFormat(str, Enum):
+    """The file format of exported tables"""
+
+    CSV = "csv"
+    PARQUET = "parquet"
+    FEATHER = "feather"
+
+
+def has_pyarrow() -> bool:
+    """Checks if pyarrow (needed for Parquet and Feather) is installed"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def rois_frame(rois: Iterable[Any]) -> Any:
+    """Builds one table of the vectors of many ROIs
+
+    Args:
+        rois (Iterable[Any]): The ROIs (with id, type and vectors)
+
+    Returns:
+        pd.DataFrame: A row per vector with the id and type of its ROI, the index of
+            the vector within the ROI and its coordinates
+    """
+    import numpy as np
+    import pandas as pd
+
+    rois = [roi for roi in rois if roi is not None]
+    vectors = [[v for v in roi.vectors or () if v is not None] for roi in rois]
+    lengths = np.fromiter(map(len, vectors), dtype=np.int64, count=len(rois))
+    # None coordinates become NaN
+    coords = np.array(
+        [(v.x, v.y, v.z, v.t, v.c) for roi_vectors in vectors for v in roi_vectors],
+        dtype=np.float64,
+    ).reshape(-1, len(VECTOR_COLUMNS))
+    starts = np.cumsum(lengths) - lengths
+
+    def per_vector(values: Any) -> Any:
+        return np.repeat(np.asarray(values), lengths)
+
+    frame = pd.DataFrame(coords, columns=VECTOR_COLUMNS)
+    frame.insert(0, "roi", per_vector([str(roi.id) for roi in rois]))
+    types = [getattr(roi.type, "value", roi.type) for roi in rois]
+    frame.insert(1, "type", pd.Categorical(per_vector(types)))
+    frame.insert(2, "vector", np.arange(len(frame)) - per_vector(starts))
+    return frame
+
+
+def rois_meta_frame(rois: Iterable[Any]) -> Any:
+    """Builds one table of the metadata of many ROIs
+
+    Nested objects (like the creator) become a column per field ("creator.sub"),
+    lists (like the comments) are stored as json.
+
+    Args:
+        rois (Iterable[Any]): The ROIs (pydantic models)
+
+    Returns:
+        pd.DataFrame: A row per ROI with its id (as "roi") and metadata
+    """
+    import pandas as pd
+
+    rows = []
+    for roi in rois:
+        if roi is None:
+            continue
+        # The json round trip turns enums, dates and ids into plain values
+        fields = json.loads(json.dumps(roi.dict(), default=str))
+        fields = {key: value for key, value in fields.items() if key not in ROI_META_EXCLUDE}
+        rows.append({"roi": str(fields.pop("id")), **fields})
+
+    frame = pd.json_normalize(rows) if rows else pd.DataFrame(columns=["roi"])
+    for column in frame.columns:
+        if frame[column].map(lambda value: isinstance(value, (list, dict))).any():
+            frame[column] = frame[column].map(
+                lambda value: json.dumps(value) if isinstance(value, (list, dict)) else value
+            )
+    return frame
+
+
+def write_frame(frame: Any, path: str, format: TableFormat = TableFormat.PARQUET) -> str:
+    """Writes a data frame
+
+    Args:
+        frame (pd.DataFrame): The table
+        path (str): The path without extension
+        format (TableFormat, optional): The format. Defaults to TableFormat.PARQUET.
+
+    Returns:
+        str: The path of the written file (with the extension of the format)
+    """
+    format = TableFormat(format)
+    if format != TableFormat.CSV and not has_pyarrow():
+        logger.warning(f"Writing {path} as csv, as {format.value} requires pyarrow")
+        format = TableFormat.CSV
+
+    target = f"{path}.{format.value}"
+    if format == TableFormat.PARQUET:
+        frame.to_parquet(target, index=False)
+    elif format == TableFormat.FEATHER:
+        frame.reset_index(drop=True).to_feather(target)
+    else:
+        frame.to_csv(target, index=False)
+    return target
+
+
+def _open_stored_parquet(store: Any) -> Any:
+    # The Parquet scalar holds the path of the file in the object store of the datalayer
+    return datalayer_fs().open(store.value, "rb", block_size=COPY_BLOCK_SIZE)
+
+
+def export_table(table: Any, path: str, format: TableFormat = TableFormat.PARQUET) -> str:
+    """Exports a mikro table without loading it as a whole
+
+    Parquet is copied byte by byte from the store, Feather is converted row
+    group by row group. If the stored file cannot be read directly, the table
+    is loaded and written with `write_frame`.
+
+    Args:
+        table (Any): The table (with its Parquet store)
+        path (str): The path without extension
+        format (TableFormat, optional): The format. Defaults to TableFormat.PARQUET.
+
+    Returns:
+        str: The path of the written file
+    """
+    format = TableFormat(format)
+    target = f"{path}.{format.value}"
+    if format != TableFormat.CSV and getattr(table, "store", None) is not None:
+        try:
+            with _open_stored_parquet(table.store) as source:
+                if format == TableFormat.PARQUET:
+                    with open(target, "wb") as destination:
+                        shutil.copyfileobj(source, destination, COPY_BLOCK_SIZE)
+                else:
+                    _parquet_to_feather(source, target)
+            return target
+        except Exception as e:
+            logger.warning(f"Could not stream the stored table {table.id} ({e}). Loading it")
+            if os.path.exists(target):
+                os.remove(target)
+
+    return write_frame(table.data, path, format)
+
+
+def _parquet_to_feather(source: Any, target: str) -> None:
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    parquet = pyarrow.parquet.ParquetFile(source)
+    with pyarrow.ipc.new_file(target, parquet.schema_arrow) as writer:
+        for index in range(parquet.num_row_groups):
+            writer.write_table(parquet.read_row_group(index))
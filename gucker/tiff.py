@@ -0,0 +1,87 @@
+"""Streaming TIFF writing
+
+Representations are lazily backed by a (zarr) store. Instead of loading the
+whole array into memory, the writer walks the array block by block along its
+leading dimensions and appends the planes of each block to the TIFF file.
+Peak memory is therefore bounded by one block, not by the image.
+
+Blocks follow the chunking of the store where the C order of the planes
+allows it: a block only spans several indices of a dimension if the chunks
+span all inner dimensions. Otherwise a chunk covering several indices (e.g.
+chunks (2, 1, y, x) of shape (2, 3, y, x)) is decoded once for every index,
+trading decoding time for memory.
+"""
+import itertools
+from typing import Any, Iterator, Optional, Tuple
+
+import numpy as np
+import tifffile
+
+# Files larger than this are written as BigTIFF (classic TIFF is limited to 4 GB)
+BIGTIFF_THRESHOLD = 2**32 - 2**25
+
+
+def _unwrap(data: Any) -> Any:
+    # xarray.DataArray wraps the dask/zarr/numpy array in .data
+    return data.data if hasattr(data, "dims") else data
+
+
+def _block_shape(array: Any) -> Tuple[int, ...]:
+    leading = array.shape[:-2]
+    chunks = getattr(array, "chunksize", None) or getattr(array, "chunks", None)
+    if not chunks or not all(isinstance(c, int) for c in chunks):
+        return (1,) * len(leading)
+
+    # Planes have to be written in C order, so a block may only span more than
+    # one index of a dimension if it spans the full extent of all inner ones
+    block = []
+    spans_inner = True
+    for size, chunk in reversed(list(zip(leading, chunks[:-2]))):
+        block.insert(0, min(size, chunk) if spans_inner else 1)
+        spans_inner = spans_inner and chunk >= size
+    return tuple(block)
+
+
+def iter_planes(data: Any) -> Iterator[np.ndarray]:
+    """Yields the 2D planes of a (lazy) array in C order
+
+    Args:
+        data (Any): A numpy, dask, zarr or xarray array with at least two dimensions
+
+    Yields:
+        Iterator[np.ndarray]: The planes
+    """
+    array = _unwrap(data)
+    leading = array.shape[:-2]
+    block = _block_shape(array)
+
+    starts = [range(0, size, step) for size, step in zip(leading, block)]
+    for start in itertools.product(*starts):
+        index = tuple(slice(i, i + step) for i, step in zip(start, block))
+        loaded = np.asarray(array[index])
+        for plane in itertools.product(*(range(n) for n in loaded.shape[:-2])):
+            yield loaded[plane]
+
+
+def write_tiff(path: str, data: Any, compression: Optional[str] = None) -> None:
+    """Writes a (lazy) array to a TIFF file plane by plane
+
+    Args:
+        path (str): The path of the file
+        data (Any): A numpy, dask, zarr or xarray array with at least two dimensions
+        compression (Optional[str], optional): A tifffile compression (e.g. "zlib"). Defaults to
+            None.
+    """
+    array = _unwrap(data)
+    dtype = np.dtype(array.dtype)
+    nbytes = int(np.prod(array.shape)) * dtype.itemsize
+
+    with tifffile.TiffWriter(path, bigtiff=nbytes > BIGTIFF_THRESHOLD) as tif:
+        tif.write(
+            iter_planes(array),
+            shape=array.shape,
+            dtype=dtype,
+            # Planes are separate channels, not the components of an RGB image
+            photometric="minisblack",
+            compression=compression,
+        )
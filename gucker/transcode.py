@@ -0,0 +1,160 @@
+"""Recompression before upload
+
+Uncompressed TIFFs cost their full size in bandwidth and storage. The
+transcoder losslessly recompresses files matching a rule into a staging
+directory before they are uploaded. It runs in a process pool, so the
+(CPU bound) compression neither blocks the watcher nor competes for the GIL
+with the uploads. Rules are given as `pattern=codec` pairs separated by ";",
+where the pattern is a regular expression matched against the path relative to
+the watched folder and the codec is a tifffile compression, e.g.
+
+    .*\\.tiff?=zlib;raw/.*\\.tif=zstd
+
+Codecs other than zlib require the imagecodecs package. Files that fail to
+transcode are uploaded unchanged.
+"""
+import logging
+import os
+import re
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rules(rules: str) -> List[Tuple[Pattern, str]]:
+    """Parses transcoding rules
+
+    Args:
+        rules (str): The rules (e.g. ".*\\.tif=zlib;.*\\.tiff=zstd")
+
+    Returns:
+        List[Tuple[Pattern, str]]: The compiled patterns and their codecs
+    """
+    parsed = []
+    for rule in filter(None, (r.strip() for r in rules.split(";"))):
+        pattern, separator, codec = rule.rpartition("=")
+        if not separator or not pattern or not codec:
+            raise ValueError(f"Invalid transcoding rule {rule}. Expected pattern=codec")
+        parsed.append((re.compile(pattern), codec.strip()))
+    return parsed
+
+
+def recompress_tiff(source: str, destination: str, compression: str) -> str:
+    """Rewrites a TIFF page by page with another compression
+
+    Pixel data, descriptions (e.g. OME or ImageJ metadata) and resolutions are
+    preserved. Runs in a worker process.
+
+    Args:
+        source (str): The TIFF to read
+        destination (str): The TIFF to write
+        compression (str): The tifffile compression
+
+    Returns:
+        str: The destination
+    """
+    import tifffile
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        with tifffile.TiffFile(source) as tif, tifffile.TiffWriter(
+            destination, bigtiff=tif.is_bigtiff
+        ) as out:
+            for page in tif.pages:
+                out.write(
+                    page.asarray(),
+                    compression=compression,
+                    photometric=page.photometric,
+                    planarconfig=page.planarconfig,
+                    description=page.description or None,
+                    resolution=page.get_resolution(),
+                    resolutionunit=page.resolutionunit,
+                    metadata=None,
+                    contiguous=False,
+                )
+    except Exception:
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+    return destination
+
+
+class Transcoder:
+    """Recompresses files in a process pool
+
+    Args:
+        rules (str): The transcoding rules (see the module documentation)
+        staging_dir (str): The directory the transcoded files are written to
+        max_workers (Optional[int], optional): The number of processes. Defaults to the number of
+            CPUs.
+    """
+
+    def __init__(self, rules: str, staging_dir: str, max_workers: Optional[int] = None) -> None:
+        self.rules = parse_rules(rules)
+        self.staging_dir = staging_dir
+        self.max_workers = max_workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.running: Dict[Future, str] = {}
+
+    @property
+    def pending(self) -> int:
+        """The number of files being transcoded"""
+        return len(self.running)
+
+    def codec_for(self, relpath: str) -> Optional[str]:
+        """The codec of the first rule matching a path (None if no rule matches)"""
+        for pattern, codec in self.rules:
+            if pattern.match(relpath):
+                return codec
+        return None
+
+    def submit(self, path: str, codec: str) -> None:
+        """Starts transcoding a file
+
+        Args:
+            path (str): The file
+            codec (str): The codec to compress with
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+        # A directory per file keeps the file name (it becomes the name on the server)
+        destination = os.path.join(self.staging_dir, uuid.uuid4().hex, os.path.basename(path))
+        future = self.executor.submit(recompress_tiff, path, destination, codec)
+        self.running[future] = path
+
+    def done(self) -> List[Tuple[str, str]]:
+        """Returns the finished files
+
+        Returns:
+            List[Tuple[str, str]]: The original path and the path to upload (the
+                transcoded file, or the original if transcoding failed)
+        """
+        finished = []
+        for future in [future for future in self.running if future.done()]:
+            path = self.running.pop(future)
+            try:
+                finished.append((path, future.result()))
+            except Exception as e:
+                logger.warning(f"Could not transcode {path} ({e}). Uploading it unchanged")
+                finished.append((path, path))
+        return finished
+
+    def close(self) -> None:
+        """Stops the worker processes"""
+        for future in self.running:
+            future.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        self.running.clear()
+
+    def __enter__(self) -> "Transcoder":
+        """Returns the transcoder"""
+        return self
+
+    def __exit__(self, *args, **kwargs) -> None:
+        """Shuts the transcoder down"""
+        self.close()
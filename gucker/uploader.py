@@ -0,0 +1,213 @@
+"""Concurrent uploads
+
+The upload pool runs uploads on a bounded number of worker threads and limits
+the number of bytes that are in flight at the same time. Results are handed
+back to the (single) consuming thread either in the order the files were
+submitted or in the order the uploads finished. Queued uploads start by
+priority and, optionally, no faster than a bandwidth limit allows.
+"""
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Generic, Iterator, List, Optional, Tuple, TypeVar
+
+from gucker.scheduler import BandwidthLimiter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def retry(fn: Callable[[], T], description: str, retries: int = 3, backoff: float = 1) -> T:
+    """Calls a function, retrying it with exponential backoff if it fails
+
+    Args:
+        fn (Callable[[], T]): The function
+        description (str): What the function does (for the log)
+        retries (int, optional): How often a failed call is retried before its error is
+            raised. Defaults to 3.
+        backoff (float, optional): Seconds to wait before the first retry, doubled for
+            every further retry. Defaults to 1.
+
+    Returns:
+        T: The result of the function
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2**attempt
+            logger.warning(
+                f"{description} failed ({e}). Retrying in {delay} seconds "
+                f"({attempt + 1}/{retries})"
+            )
+            time.sleep(delay)
+
+
+class _Upload:
+    def __init__(self, path: str, size: int) -> None:
+        self.path = path
+        self.size = size
+        self.future: Optional[Future] = None
+
+
+class UploadPool(Generic[T]):
+    """Uploads files concurrently
+
+    Files are submitted with `submit` and the results are retrieved with
+    `collect`. Both are meant to be called from the same thread (the streaming
+    loop); only the uploads themselves run on the worker threads. Each upload
+    runs in a copy of the context of the submitting thread, so context bound
+    clients (e.g. the mikro rath and datalayer) are available to the workers.
+
+    Queued files start in the order of their priority (lower first), files of
+    the same priority in the order they were submitted.
+
+    Args:
+        upload (Callable[[str], T]): The function uploading a single file
+        max_workers (int, optional): The number of concurrent uploads. Defaults to 4.
+        max_inflight_bytes (int, optional): The maximum number of bytes uploading at the
+            same time. A single file larger than this is uploaded on its own. Defaults to 2 GB.
+        ordered (bool, optional): Return results in submission order instead of
+            completion order. Defaults to True.
+        priority (Optional[Callable[[str, int], int]], optional): The priority of a file
+            given its path and size. Defaults to the same priority for all files.
+        limiter (Optional[BandwidthLimiter], optional): Limits the rate at which uploads
+            start. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        upload: Callable[[str], T],
+        max_workers: int = 4,
+        max_inflight_bytes: int = 2 * 1024**3,
+        ordered: bool = True,
+        priority: Optional[Callable[[str, int], int]] = None,
+        limiter: Optional[BandwidthLimiter] = None,
+    ) -> None:
+        self.upload = upload
+        self.max_workers = max(1, max_workers)
+        self.max_inflight_bytes = max_inflight_bytes
+        self.ordered = ordered
+        self.priority = priority
+        self.limiter = limiter
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="gucker-upload"
+        )
+        self.sequence = itertools.count()
+        # Queued uploads as (priority, sequence, upload)
+        self.backlog: List[Tuple[int, int, _Upload]] = []
+        # All uncollected uploads (queued, running and finished) in submission order
+        self.uploads: Deque[_Upload] = deque()
+
+    @property
+    def idle(self) -> bool:
+        """True if there are no queued, running or uncollected uploads"""
+        return not self.uploads
+
+    def submit(self, path: str) -> bool:
+        """Queues a file for upload
+
+        Files that cannot be read (e.g. as they were moved away) are skipped.
+
+        Args:
+            path (str): The path of the file
+
+        Returns:
+            bool: True if the file was queued
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Skipping the upload of {path} ({e})")
+            return False
+
+        upload = _Upload(path, size)
+        priority = self.priority(path, upload.size) if self.priority else 0
+        heapq.heappush(self.backlog, (priority, next(self.sequence), upload))
+        self.uploads.append(upload)
+        self._dispatch()
+        return True
+
+    def _running(self) -> List[_Upload]:
+        return [u for u in self.uploads if u.future is not None and not u.future.done()]
+
+    def _dispatch(self) -> None:
+        while self.backlog:
+            upload = self.backlog[0][2]
+            running = self._running()
+            if len(running) >= self.max_workers:
+                return
+            inflight_bytes = sum(u.size for u in running)
+            if inflight_bytes and inflight_bytes + upload.size > self.max_inflight_bytes:
+                return
+            if self.limiter and not self.limiter.acquire(upload.size):
+                return
+
+            heapq.heappop(self.backlog)
+            context = contextvars.copy_context()
+            upload.future = self.executor.submit(context.run, self.upload, upload.path)
+
+    def _pop_finished(self) -> List[_Upload]:
+        if self.ordered:
+            finished = []
+            while self.uploads and self.uploads[0].future and self.uploads[0].future.done():
+                finished.append(self.uploads.popleft())
+            return finished
+
+        finished = [u for u in self.uploads if u.future and u.future.done()]
+        for upload in finished:
+            self.uploads.remove(upload)
+        return finished
+
+    def collect(self, timeout: float = 0) -> Iterator[Tuple[str, T]]:
+        """Waits up to `timeout` seconds for uploads to finish and returns their results
+
+        Raises the exception of a failed upload.
+
+        Args:
+            timeout (float, optional): The maximum time to wait. Defaults to 0.
+
+        Yields:
+            Iterator[Tuple[str, T]]: The path and the result of each finished upload
+        """
+        self._dispatch()
+        finished = self._pop_finished()
+        if not finished and timeout:
+            running = [u.future for u in self._running()]
+            if running:
+                wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            elif self.backlog and self.limiter:
+                # Nothing is running, as the queued uploads wait for the bandwidth limit
+                time.sleep(min(timeout, self.limiter.delay()))
+            finished = self._pop_finished()
+
+        # Finished uploads free their worker and bytes, even if not yet collected
+        self._dispatch()
+
+        for upload in finished:
+            yield upload.path, upload.future.result()
+
+    def close(self) -> None:
+        """Cancels queued uploads and waits for the running ones to finish"""
+        self.backlog.clear()
+        for upload in self.uploads:
+            if upload.future:
+                upload.future.cancel()
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self) -> "UploadPool[T]":
+        """Returns the pool"""
+        return self
+
+    def __exit__(self, *args, **kwargs) -> None:
+        """Shuts the pool down"""
+        self.close()
@@ -0,0 +1,353 @@
+"""Directory watchers
+
+Watchers report the files of a directory to the streaming loop. The native
+backend uses the file system events of the operating system (through
+`watchdog`) so new files are picked up within milliseconds and an idle
+folder costs no CPU. The polling backend lists the directory at a fixed
+interval and is used when native events are unavailable (e.g. on some
+network shares).
+"""
+import logging
+import os
+import queue
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+# Directories modified more recently than this are always relisted, as file
+# systems with a coarse mtime resolution can hide changes within the same tick
+MTIME_SETTLE_SECONDS = 2
+
+
+class PathFilter:
+    """Filters files by their path relative to the watched directory
+
+    Paths use "/" as separator on every platform. Files are accepted if the
+    include pattern matches their relative path and the exclude pattern does
+    not. Directories matching the exclude pattern are skipped with everything
+    below them.
+
+    Args:
+        include (Optional[str], optional): A regular expression for files to include. Defaults to
+            all.
+        exclude (Optional[str], optional): A regular expression for files and directories to
+            exclude. Defaults to None.
+    """
+
+    def __init__(self, include: Optional[str] = None, exclude: Optional[str] = None) -> None:
+        self.include = re.compile(include) if include else None
+        self.exclude = re.compile(exclude) if exclude else None
+
+    def accepts_dir(self, relpath: str) -> bool:
+        """Checks if a directory should be descended into"""
+        return not (self.exclude and self.exclude.match(relpath))
+
+    def accepts_file(self, relpath: str) -> bool:
+        """Checks if a file should be reported"""
+        if self.exclude and self.exclude.match(relpath):
+            return False
+        return not self.include or bool(self.include.match(relpath))
+
+    def accepts_tree(self, relpath: str) -> bool:
+        """Checks a directory and all directories above it"""
+        parts = relpath.split("/")
+        return all(self.accepts_dir("/".join(parts[:i])) for i in range(1, len(parts) + 1))
+
+    def accepts(self, relpath: str, recursive: bool = True) -> bool:
+        """Checks a file and all directories above it"""
+        directory, _, _ = relpath.rpartition("/")
+        if directory and not (recursive and self.accepts_tree(directory)):
+            return False
+        return self.accepts_file(relpath)
+
+
+class Watcher:
+    """Base class for directory watchers
+
+    A watcher first reports the files that already exist in the directory
+    (through `scan`) and afterwards the files that appear (through `poll`).
+
+    Args:
+        base_dir (str): The directory to watch
+        filter (Optional[PathFilter], optional): The files to report. Defaults to all.
+        recursive (bool, optional): Also watch the subdirectories. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        filter: Optional[PathFilter] = None,
+        recursive: bool = False,
+    ) -> None:
+        self.base_dir = os.path.abspath(base_dir)
+        self.filter = filter or PathFilter()
+        self.recursive = recursive
+
+    def relpath(self, path: str) -> str:
+        """The path relative to the watched directory (with "/" separators)"""
+        return os.path.relpath(path, self.base_dir).replace(os.sep, "/")
+
+    def start(self) -> None:
+        """Starts watching the directory"""
+
+    def stop(self) -> None:
+        """Stops watching the directory"""
+
+    def scan(self) -> List[str]:
+        """Lists the accepted files that currently exist in the directory
+
+        Returns:
+            List[str]: The paths of the files
+        """
+        files = []
+        for root, dirs, names in os.walk(self.base_dir):
+            if not self.recursive:
+                dirs.clear()
+            dirs[:] = [
+                d for d in dirs if self.filter.accepts_dir(self.relpath(os.path.join(root, d)))
+            ]
+            files += [
+                os.path.join(root, name)
+                for name in names
+                if self.filter.accepts_file(self.relpath(os.path.join(root, name)))
+            ]
+        return files
+
+    def poll(self, timeout: float) -> List[str]:
+        """Waits for new files
+
+        Args:
+            timeout (float): The maximum time to wait for new files in seconds
+
+        Returns:
+            List[str]: The paths of the files that appeared (might be empty)
+        """
+        raise NotImplementedError
+
+    def closed(self) -> List[str]:
+        """Returns the files that were closed after writing since the last call
+
+        Only backends with close-write events report closed files.
+
+        Returns:
+            List[str]: The paths of the closed files
+        """
+        return []
+
+    def __enter__(self) -> "Watcher":
+        """Starts watching"""
+        self.start()
+        return self
+
+    def __exit__(self, *args, **kwargs) -> None:
+        """Stops watching"""
+        self.stop()
+
+
+class _Directory(NamedTuple):
+    mtime: int
+    subdirs: List[str]
+    files: Set[str]
+
+
+class PollingWatcher(Watcher):
+    """Watches a directory by listing it every `timeout` seconds
+
+    The listing is incremental: a directory is only listed again if its
+    modification time changed, otherwise only its (cached) subdirectories are
+    visited. A tick over an unchanged tree therefore costs one `stat` per
+    directory, independent of the number of files.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        filter: Optional[PathFilter] = None,
+        recursive: bool = False,
+    ) -> None:
+        super().__init__(base_dir, filter, recursive)
+        self.directories: Dict[str, _Directory] = {}
+
+    def _scan_directory(self, path: str) -> List[str]:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.directories.pop(path, None)
+            return []
+
+        cached = self.directories.get(path)
+        settled = time.time_ns() - mtime > MTIME_SETTLE_SECONDS * 10**9
+        if cached and cached.mtime == mtime and settled:
+            new_files = []
+            subdirs = cached.subdirs
+        else:
+            files, subdirs = set(), []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    relpath = self.relpath(entry.path)
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive and self.filter.accepts_dir(relpath):
+                            subdirs.append(entry.path)
+                    elif entry.is_file() and self.filter.accepts_file(relpath):
+                        files.add(entry.path)
+
+            new_files = [f for f in files if not cached or f not in cached.files]
+            self.directories[path] = _Directory(mtime, subdirs, files)
+
+        for subdir in subdirs:
+            new_files += self._scan_directory(subdir)
+        return new_files
+
+    def scan(self) -> List[str]:
+        """Lists the accepted files (and forgets the cached listings)"""
+        self.directories.clear()
+        return self._scan_directory(self.base_dir)
+
+    def poll(self, timeout: float) -> List[str]:
+        """Lists the directories that changed after waiting"""
+        time.sleep(timeout)
+        return self._scan_directory(self.base_dir)
+
+
+class _QueueHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "NativeWatcher") -> None:
+        super().__init__()
+        self.watcher = watcher
+
+    def on_created(self, event) -> None:  # noqa: ANN001
+        self.watcher.put(event.src_path, event.is_directory)
+
+    def on_moved(self, event) -> None:  # noqa: ANN001
+        self.watcher.put(event.dest_path, event.is_directory)
+
+    def on_closed(self, event) -> None:  # noqa: ANN001
+        self.watcher.put(event.src_path, event.is_directory, closed=True)
+
+
+class NativeWatcher(Watcher):
+    """Watches a directory through native file system events (requires `watchdog`)"""
+
+    def __init__(
+        self,
+        base_dir: str,
+        filter: Optional[PathFilter] = None,
+        recursive: bool = False,
+    ) -> None:
+        if Observer is None:
+            raise RuntimeError(
+                "Native watching requires the watchdog package. "
+                "Install it or use the polling backend."
+            )
+        super().__init__(base_dir, filter, recursive)
+        self.events: "queue.Queue[Tuple[str, bool]]" = queue.Queue()
+        self.closed_files: List[str] = []
+        self.observer = None
+
+    def put(self, path: str, is_directory: bool = False, closed: bool = False) -> None:
+        """Queues a file event (called from the watchdog thread)"""
+        relpath = self.relpath(os.path.abspath(path))
+        if relpath.startswith("../"):
+            return
+
+        if is_directory:
+            if closed:
+                return
+            # Directories moved into the tree bring their files without separate events
+            if self.recursive and self.filter.accepts_tree(relpath):
+                for root, _, names in os.walk(path):
+                    for name in names:
+                        self.put(os.path.join(root, name))
+        elif self.filter.accepts(relpath, self.recursive):
+            self.events.put((path, closed))
+
+    def start(self) -> None:
+        """Starts the watchdog observer (if it is not running yet)"""
+        if self.observer is not None:
+            return
+        observer = Observer()
+        observer.schedule(_QueueHandler(self), self.base_dir, recursive=self.recursive)
+        observer.start()
+        self.observer = observer
+
+    def stop(self) -> None:
+        """Stops the watchdog observer"""
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+    def poll(self, timeout: float) -> List[str]:
+        """Waits for file events"""
+        try:
+            events = [self.events.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+
+        self.closed_files += [path for path, closed in events if closed]
+        return [path for path, closed in events if not closed]
+
+    def closed(self) -> List[str]:
+        """Returns the files that were closed after writing since the last call"""
+        closed, self.closed_files = self.closed_files, []
+        return closed
+
+
+WATCHERS = {
+    "native": NativeWatcher,
+    "polling": PollingWatcher,
+}
+
+
+def get_watcher(
+    base_dir: str,
+    filter: Optional[PathFilter] = None,
+    recursive: bool = False,
+    backend: str = "auto",
+) -> Watcher:
+    """Creates a watcher for a directory
+
+    Args:
+        base_dir (str): The directory to watch
+        filter (Optional[PathFilter], optional): The files to report. Defaults to all.
+        recursive (bool, optional): Also watch the subdirectories. Defaults to False.
+        backend (str, optional): "native", "polling" or "auto" (native if it can be started,
+            polling otherwise). Defaults to "auto".
+
+    Returns:
+        Watcher: The watcher (already started with the "auto" native backend)
+    """
+    if backend == "auto":
+        if Observer is None:
+            backend = "polling"
+        else:
+            watcher = NativeWatcher(base_dir, filter, recursive)
+            try:
+                # Native events can run out, e.g. when the inotify watch limit is reached
+                watcher.start()
+            except OSError as e:
+                logger.warning(f"Could not watch {base_dir} natively ({e}), polling instead")
+                backend = "polling"
+            else:
+                logger.info(f"Watching {base_dir} with the native backend")
+                return watcher
+
+    if backend not in WATCHERS:
+        raise ValueError(f"Unknown watcher backend {backend}. Choose from {list(WATCHERS)}")
+
+    logger.info(f"Watching {base_dir} with the {backend} backend")
+    return WATCHERS[backend](base_dir, filter, recursive)
@@ -0,0 +1,46 @@
+import json
+import zipfile
+
+from gucker.batching import INDEX_NAME, Batcher, write_archive
+
+
+def test_batches_are_due_by_count_or_force(tmp_path):
+    files = []
+    for i in range(3):
+        file = tmp_path / f"plane{i}.tif"
+        file.write_bytes(b"x" * 10)
+        files.append(str(file))
+
+    batcher = Batcher(threshold=100, window=60, max_files=2)
+    assert all(batcher.accepts(f) for f in files)
+    for file in files:
+        batcher.add(file)
+        if batcher.is_due():
+            assert batcher.take() == files[:2]
+
+    assert batcher.take() == []
+    assert batcher.take(force=True) == files[2:]
+    assert batcher.pending == 0
+
+
+def test_archive_contains_index(tmp_path):
+    (tmp_path / "well").mkdir()
+    file = tmp_path / "well" / "plane.tif"
+    file.write_bytes(b"pixels")
+
+    archive_path = write_archive([str(file)], str(tmp_path), str(tmp_path / "batch.zip"))
+
+    with zipfile.ZipFile(archive_path) as archive:
+        assert archive.read("well/plane.tif") == b"pixels"
+        index = json.loads(archive.read(INDEX_NAME))
+    assert index["files"][0]["name"] == "well/plane.tif"
+    assert index["files"][0]["size"] == 6
+
+
+def test_files_that_vanished_are_not_batched(tmp_path):
+    missing = str(tmp_path / "moved.tif")
+
+    batcher = Batcher(threshold=100)
+    assert not batcher.accepts(missing)
+    batcher.add(missing)
+    assert batcher.pending == 0
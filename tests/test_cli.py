@@ -0,0 +1,16 @@
+from gucker.cli import build_parser
+
+
+def test_serve_arguments():
+    args = build_parser().parse_args(
+        ["serve", "--watch", "/data", "--export", "/export", "--watcher", "polling"]
+    )
+    assert args.command == "serve"
+    assert args.watch == "/data"
+    assert args.export == "/export"
+    assert args.watcher == "polling"
+    assert args.grace_period == 2
+
+
+def test_no_command_starts_the_window():
+    assert build_parser().parse_args([]).command is None
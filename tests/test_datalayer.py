@@ -0,0 +1,144 @@
+import hashlib
+import io
+import itertools
+import os
+
+import pytest
+
+from gucker.datalayer import MIN_PART_SIZE, download_file, upload_parts
+
+
+class FakeS3:
+    """The multipart calls of s3fs' call_s3, backed by memory"""
+
+    def __init__(self, fail_parts=()):
+        self.ids = itertools.count(1)
+        self.uploads = {}
+        self.objects = {}
+        self.fail_parts = set(fail_parts)
+        self.uploaded_parts = []
+
+    def call_s3(self, method, **kwargs):
+        return getattr(self, method)(**kwargs)
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = str(next(self.ids))
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber in self.fail_parts:
+            self.fail_parts.discard(PartNumber)
+            raise ConnectionError("network blip")
+        self.uploaded_parts.append(PartNumber)
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": f'"{PartNumber}"'}
+
+    def list_parts(self, Bucket, Key, UploadId, PartNumberMarker):
+        parts = sorted(self.uploads[UploadId])
+        return {"Parts": [{"PartNumber": n, "ETag": f'"{n}"'} for n in parts]}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        assert numbers == sorted(parts)
+        self.objects[(Bucket, Key)] = b"".join(parts[n] for n in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        del self.uploads[UploadId]
+
+
+@pytest.fixture
+def large_file(tmp_path):
+    path = tmp_path / "large.tif"
+    path.write_bytes(bytes(range(256)) * (MIN_PART_SIZE * 3 // 256 + 1000))
+    return str(path)
+
+
+def test_parts_are_assembled_in_order(tmp_path, large_file):
+    fs = FakeS3()
+    checkpoint = str(tmp_path / "upload.json")
+
+    assert upload_parts(fs, large_file, "large.tif", checkpoint, part_size=1) == "large.tif"
+
+    with open(large_file, "rb") as f:
+        assert fs.objects[("mikromedia", "large.tif")] == f.read()
+    assert sorted(fs.uploaded_parts) == [1, 2, 3, 4]
+    assert not (tmp_path / "upload.json").exists()
+
+
+def test_interrupted_uploads_resume_with_the_missing_parts(tmp_path, large_file):
+    fs = FakeS3(fail_parts=[3])
+    checkpoint = str(tmp_path / "upload.json")
+
+    with pytest.raises(ConnectionError):
+        upload_parts(fs, large_file, "large.tif", checkpoint, part_size=1)
+    assert sorted(fs.uploaded_parts) == [1, 2, 4]
+
+    fs.uploaded_parts.clear()
+    upload_parts(fs, large_file, "large.tif", checkpoint, part_size=1)
+    assert fs.uploaded_parts == [3]
+    with open(large_file, "rb") as f:
+        assert fs.objects[("mikromedia", "large.tif")] == f.read()
+
+
+def test_changed_files_restart_their_upload(tmp_path, large_file):
+    fs = FakeS3(fail_parts=[1])
+    checkpoint = str(tmp_path / "upload.json")
+    with pytest.raises(ConnectionError):
+        upload_parts(fs, large_file, "large.tif", checkpoint, part_size=1)
+
+    with open(large_file, "ab") as f:
+        f.write(b"more")
+    fs.uploaded_parts.clear()
+    upload_parts(fs, large_file, "large.tif", checkpoint, part_size=1)
+
+    assert sorted(fs.uploaded_parts) == [1, 2, 3, 4]
+    assert not fs.uploads
+
+
+class FakeObjects:
+    """The read calls of an fsspec file system, backed by memory"""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.reads = []
+
+    def info(self, path):
+        data = self.objects[path]
+        return {"size": len(data), "ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def open(self, path, mode="rb", **kwargs):
+        stream = io.BytesIO(self.objects[path])
+        seek = stream.seek
+
+        def record_seek(offset, whence=0):
+            self.reads.append(offset)
+            return seek(offset, whence)
+
+        stream.seek = record_seek
+        return stream
+
+
+def test_partial_downloads_are_continued(tmp_path):
+    data = os.urandom(1000)
+    fs = FakeObjects({"mikromedia/raw.tif": data})
+    target = tmp_path / "raw.tif.part"
+    target.write_bytes(data[:600])
+
+    assert download_file("/mikromedia/raw.tif?signature", str(target), fs=fs) == 1000
+    assert fs.reads == [600]
+    assert target.read_bytes() == data
+
+
+def test_corrupt_downloads_are_discarded(tmp_path):
+    data = os.urandom(1000)
+    fs = FakeObjects({"mikromedia/raw.tif": data})
+    target = tmp_path / "raw.tif.part"
+    target.write_bytes(b"x" * 600)
+
+    with pytest.raises(IOError):
+        download_file("mikromedia/raw.tif", str(target), fs=fs)
+    assert not target.exists()
+    download_file("mikromedia/raw.tif", str(target), fs=fs)
+    assert target.read_bytes() == data
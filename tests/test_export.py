@@ -0,0 +1,204 @@
+import asyncio
+import os
+import time
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("mikro")
+pytest.importorskip("numpy")
+tifffile = pytest.importorskip("tifffile")
+
+from slugify import slugify  # noqa: E402
+
+from benchmarks.fake_mikro import FakeFile, FakeMikro, FakeModel  # noqa: E402
+from gucker import export  # noqa: E402
+from gucker.export import ExportProfile, Exporter, ImageFormat  # noqa: E402
+from gucker.manifest import ExportManifest  # noqa: E402
+from gucker.tables import TableFormat  # noqa: E402
+
+
+@pytest.fixture
+def mikro(tmp_path):
+    return FakeMikro(str(tmp_path / "bucket"))
+
+
+def files_in(path):
+    return sorted(
+        os.path.relpath(os.path.join(root, file), path)
+        for root, _, files in os.walk(path)
+        for file in files
+    )
+
+
+def test_stage_pages_wait_for_pending_positions(mikro, tmp_path, monkeypatch):
+    stage = mikro.add_stage(12, 1, (2, 8, 8))
+    written = []
+
+    def write_image(path, data):
+        time.sleep(0.01)
+        export_image(path, data)
+        written.append(path)
+
+    export_image = export.write_image
+    monkeypatch.setattr("gucker.export.write_image", write_image)
+
+    # The positions submitted but not written yet whenever a page is fetched
+    pending = []
+    get_positions = mikro.get_export_positions
+
+    def get_export_positions(stage, limit=None, offset=None, **kwargs):
+        pending.append((offset or 0) - len(written))
+        return get_positions(stage, limit=limit, offset=offset)
+
+    mikro.get_export_positions = get_export_positions
+    exporter = Exporter(str(tmp_path), page_size=2, max_positions=3, profile=ExportProfile.IMAGES)
+    with mikro.patch():
+        asyncio.run(exporter.aexport_stage(stage))
+
+    assert len(written) == 12
+    assert len(pending) == 7
+    assert max(pending) <= 3
+
+
+def test_tables_are_exported_again_in_another_format(tmp_path):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    table = FakeModel(id="1", name="Table", store=None, data=pd.DataFrame({"a": [1, 2]}))
+
+    for format in [TableFormat.CSV, TableFormat.PARQUET, TableFormat.PARQUET]:
+        exporter = Exporter(str(tmp_path), incremental=True, table_format=format)
+        exporter.manifest = ExportManifest(str(tmp_path))
+        exporter.export_derived_table(table, str(tmp_path))
+        exporter.manifest.save()
+
+    assert files_in(tmp_path) == ["gucker-manifest.json", "meta.json", "table.csv", "table.parquet"]
+
+
+def test_images_are_exported_again_in_another_format(mikro, tmp_path, monkeypatch):
+    fsspec = pytest.importorskip("fsspec")
+    monkeypatch.setattr("gucker.ome_zarr.datalayer_fs", lambda: fsspec.filesystem("file"))
+    store = tmp_path / "bucket" / "store"
+    store.mkdir(parents=True)
+    (store / ".zgroup").write_text('{"zarr_format": 2}')
+    representation = mikro.add_representation("Image", (2, 8, 8))
+    representation.store = FakeFile(store.as_posix())
+
+    with mikro.patch():
+        for format in [ImageFormat.TIFF, ImageFormat.ZARR, ImageFormat.ZARR]:
+            exporter = Exporter(str(tmp_path / "export"), incremental=True, image_format=format)
+            asyncio.run(exporter.aexport_image(representation))
+
+    assert files_in(tmp_path / "export" / slugify(f"ID({representation.id}) Image")) == [
+        "gucker-manifest.json",
+        "image.tiff",
+        os.path.join("image.zarr", ".zgroup"),
+        "meta.json",
+    ]
+
+
+def test_stage_exports_spawn_a_task_per_image_and_report_progress(mikro, tmp_path):
+    stage = mikro.add_stage(3, 2, (2, 8, 8), derived=1)
+    progress = []
+
+    async def aprogress(percent, *args, **kwargs):
+        progress.append(percent)
+
+    exporter = Exporter(str(tmp_path), page_size=2)
+    with mikro.patch(), mock.patch("arkitekt.aprogress", aprogress):
+        asyncio.run(exporter.aexport_stage(stage))
+
+    files = files_in(tmp_path / slugify(f"ID({stage.id}) Benchmark Stage"))
+    assert len([file for file in files if file.endswith(".tiff")]) == 12
+    assert len([file for file in files if file.endswith("position.json")]) == 3
+    # The stage, a task per position, image, derived query and derived image
+    assert exporter.submitted == 1 + 3 + 6 + 6 + 6
+    assert progress == sorted(progress) and progress[-1] == 100
+
+
+def test_failing_tasks_fail_the_export(mikro, tmp_path, monkeypatch):
+    stage = mikro.add_stage(2, 2, (2, 8, 8))
+
+    def write_image(path, data):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("gucker.export.write_image", write_image)
+    exporter = Exporter(str(tmp_path))
+    with mikro.patch(), pytest.raises(OSError, match="disk full"):
+        asyncio.run(exporter.aexport_stage(stage))
+    assert not exporter.tasks
+    assert exporter.executor is None
+
+
+def test_unchanged_dataset_files_are_not_downloaded_again(mikro, tmp_path):
+    dataset = mikro.add_dataset(3, 100, str(tmp_path / "originals"))
+    downloads = []
+    download_file = mikro.download_file
+
+    def record_download(value, target, **kwargs):
+        downloads.append(target)
+        return download_file(value, target, **kwargs)
+
+    mikro.download_file = record_download
+    with mikro.patch():
+        for _ in range(2):
+            exporter = Exporter(str(tmp_path / "export"), incremental=True)
+            asyncio.run(exporter.aexport_dataset(dataset))
+
+    assert len(downloads) == 3
+    export_dir = tmp_path / "export" / f"ID({dataset.id}) Benchmark Dataset"
+    assert files_in(export_dir) == [
+        "file-0.bin",
+        "file-1.bin",
+        "file-2.bin",
+        "gucker-manifest.json",
+    ]
+
+
+def test_dataset_files_with_new_presigned_urls_are_not_downloaded_again(mikro, tmp_path):
+    dataset = mikro.add_dataset(2, 100, str(tmp_path / "originals"))
+    downloads = []
+    download_file = mikro.download_file
+
+    def record_download(value, target, **kwargs):
+        downloads.append(target)
+        return download_file(value, target, **kwargs)
+
+    mikro.download_file = record_download
+    with mikro.patch():
+        for signature in ["a", "b"]:
+            # Every fetch of a dataset signs the URLs of its files anew
+            for item in dataset.omerofiles:
+                path = item.file.value.partition("?")[0]
+                item.file = FakeFile(f"{path}?X-Amz-Signature={signature}")
+            exporter = Exporter(str(tmp_path / "export"), incremental=True)
+            asyncio.run(exporter.aexport_dataset(dataset))
+
+    assert len(downloads) == 2
+
+
+def test_shared_images_are_written_once_and_linked(mikro, tmp_path, monkeypatch):
+    shared = mikro.add_representation("Shared", (2, 8, 8))
+    image = mikro.add_representation("Image", (2, 8, 8), derived=2)
+    for derived in image.derived:
+        derived.derived = [shared]
+    written = []
+    write_image = export.write_image
+
+    def record_write(path, data):
+        written.append(path)
+        write_image(path, data)
+
+    monkeypatch.setattr("gucker.export.write_image", record_write)
+    with mikro.patch():
+        asyncio.run(Exporter(str(tmp_path)).aexport_image(image))
+
+    derived_dir = tmp_path / slugify(f"ID({image.id}) Image") / "derived"
+    first, second = (
+        derived_dir / slugify(f"ID({derived.id}) {derived.name}") / "derived"
+        for derived in image.derived
+    )
+    shared_dir = slugify(f"ID({shared.id}) Shared")
+    assert len(written) == 4
+    assert os.path.samefile(first / shared_dir / "image.tiff", second / shared_dir / "image.tiff")
+    assert tifffile.imread(first / shared_dir / "image.tiff").shape == (2, 8, 8)
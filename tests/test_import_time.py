@@ -0,0 +1,33 @@
+"""Guards the cold start of gucker
+
+Heavy modules must only be imported once the functionality that needs them
+is used. These tests import gucker modules in a fresh interpreter and fail if
+a heavy module sneaks into the import chain. The import times themselves are
+budgeted in the benchmark suite (`python -m benchmarks`).
+"""
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ["tifffile", "pandas", "gucker.api.schema", "qtpy", "arkitekt"]
+
+# The modules that must not be loaded by importing a gucker module
+FORBIDDEN = {
+    "gucker.cli": HEAVY_MODULES,
+    "gucker.export": HEAVY_MODULES + ["mikro", "numpy", "gucker.tiff", "gucker.ome_zarr"],
+    "gucker.service": ["tifffile", "gucker.api.schema", "gucker.tiff", "gucker.ome_zarr", "qtpy"],
+}
+
+
+def import_in_subprocess(module: str) -> subprocess.CompletedProcess:
+    code = f"import sys, {module}; print(','.join(sorted(sys.modules)))"
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+
+@pytest.mark.parametrize("module, forbidden", FORBIDDEN.items())
+def test_import_is_light(module, forbidden):
+    result = import_in_subprocess(module)
+    loaded = set(result.stdout.strip().split(","))
+
+    assert not loaded & set(forbidden)
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+
+from gucker.ledger import Ledger, file_digest
+
+
+def test_ledger_survives_restart(tmp_path):
+    file = tmp_path / "image.tif"
+    file.write_bytes(b"pixels")
+
+    with Ledger(str(tmp_path / "ledger.sqlite")) as ledger:
+        assert not ledger.is_uploaded(str(file), "A")
+        entry = ledger.record(str(file), "A", "1")
+        assert entry.hash == file_digest(str(file))
+
+    with Ledger(str(tmp_path / "ledger.sqlite")) as ledger:
+        assert ledger.is_uploaded(str(file), "A")
+        assert ledger.get(str(file), "A").file_id == "1"
+
+        file.write_bytes(b"other pixels")
+        assert not ledger.is_uploaded(str(file), "A")
+
+
+def test_uploads_are_tracked_per_dataset(tmp_path):
+    file = tmp_path / "image.tif"
+    file.write_bytes(b"pixels")
+
+    with Ledger(str(tmp_path / "ledger.sqlite")) as ledger:
+        ledger.record(str(file), "A", "1")
+        assert not ledger.is_uploaded(str(file), "B")
+        ledger.record(str(file), "B", "2")
+        assert ledger.get(str(file), "A").file_id == "1"
+        assert ledger.get(str(file), "B").file_id == "2"
+
+
+def test_ledgers_keyed_by_path_are_migrated(tmp_path):
+    file = tmp_path / "image.tif"
+    file.write_bytes(b"pixels")
+    connection = sqlite3.connect(str(tmp_path / "ledger.sqlite"))
+    with connection:
+        connection.execute(
+            "CREATE TABLE uploads (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, "
+            "hash TEXT, file_id TEXT, uploaded_at REAL)"
+        )
+        connection.execute(
+            "INSERT INTO uploads VALUES (?, 6, 0, 'abc', '1', 0)", (str(file),)
+        )
+    connection.close()
+
+    with Ledger(str(tmp_path / "ledger.sqlite")) as ledger:
+        entry = ledger.get(str(file), "")
+        assert (entry.hash, entry.file_id, entry.exact) == ("abc", "1", 0)
+        assert not ledger.is_uploaded(str(file), "A")
+
+
+def test_find_by_content(tmp_path):
+    original, copy = tmp_path / "image.tif", tmp_path / "copy of image.tif"
+    original.write_bytes(b"pixels")
+    copy.write_bytes(b"pixels")
+
+    with Ledger(str(tmp_path / "ledger.sqlite")) as ledger:
+        assert ledger.find(file_digest(str(copy)), "A") is None
+        ledger.record(str(original), "A", "1")
+        assert ledger.find(file_digest(str(copy)), "A").file_id == "1"
+        assert ledger.find(file_digest(str(copy)), "B") is None
+
+
+def test_files_uploaded_in_archives_are_no_duplicates(tmp_path):
+    member, copy = tmp_path / "plane.tif", tmp_path / "copy of plane.tif"
+    member.write_bytes(b"pixels")
+    copy.write_bytes(b"pixels")
+
+    with Ledger(str(tmp_path / "ledger.sqlite")) as ledger:
+        ledger.record(str(member), "A", "archive", exact=False)
+        assert ledger.is_uploaded(str(member), "A")
+        assert ledger.find(file_digest(str(copy)), "A") is None
@@ -0,0 +1,58 @@
+from gucker.manifest import ExportManifest, marker_of
+
+
+class Model:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.id = kwargs["id"]
+
+    def dict(self):
+        return self.kwargs
+
+
+def test_manifest_detects_changes(tmp_path):
+    image = tmp_path / "image.tiff"
+    image.write_bytes(b"pixels")
+    model = Model(id="1", store="s3://a")
+
+    manifest = ExportManifest(str(tmp_path))
+    key = manifest.key("representation", model.id, str(tmp_path))
+    assert not manifest.is_current(key, marker_of(model))
+    manifest.record(key, marker_of(model), [str(image)])
+    manifest.save()
+
+    manifest = ExportManifest(str(tmp_path))
+    assert manifest.is_current(key, marker_of(model))
+    assert not manifest.is_current(key, marker_of(Model(id="1", store="s3://b")))
+
+    image.write_bytes(b"truncated")
+    assert not manifest.is_current(key, marker_of(model))
+
+
+def test_manifest_verifies_digests(tmp_path):
+    file = tmp_path / "raw.czi"
+    file.write_bytes(b"abc")
+    model = Model(id="2", name="raw.czi")
+
+    manifest = ExportManifest(str(tmp_path))
+    key = manifest.key("file", model.id, str(tmp_path))
+    manifest.record(key, marker_of(model), [str(file)], digests=True)
+    assert manifest.is_current(key, marker_of(model), verify=True)
+
+    file.write_bytes(b"abd")
+    assert manifest.is_current(key, marker_of(model))
+    assert not manifest.is_current(key, marker_of(model), verify=True)
+
+
+class File:
+    def __init__(self, value):
+        self.value = value
+
+
+def test_markers_ignore_the_query_of_presigned_urls():
+    first = Model(id="3", name="raw.czi", file=File("/mikromedia/3?X-Amz-Signature=a"))
+    second = Model(id="3", name="raw.czi", file=File("/mikromedia/3?X-Amz-Signature=b"))
+    moved = Model(id="3", name="raw.czi", file=File("/mikromedia/4?X-Amz-Signature=a"))
+
+    assert marker_of(first) == marker_of(second)
+    assert marker_of(first) != marker_of(moved)
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import logging
+import urllib.request
+
+import pytest
+
+from gucker.metrics import (
+    FAILURES,
+    SPAN_SECONDS,
+    Counter,
+    Histogram,
+    JsonFormatter,
+    Registry,
+    span,
+    start_http_server,
+)
+
+
+def test_prometheus_text():
+    registry = Registry()
+    counter = registry.register(Counter("test_bytes_total", "Bytes"))
+    histogram = registry.register(Histogram("test_seconds", "Seconds", buckets=(1, 10)))
+    counter.inc(5, kind="tiff")
+    histogram.observe(0.5)
+    histogram.observe(5)
+    histogram.observe(50)
+
+    text = registry.render()
+    assert 'test_bytes_total{kind="tiff"} 5' in text
+    assert 'test_seconds_bucket{le="1"} 1' in text
+    assert 'test_seconds_bucket{le="10"} 2' in text
+    assert 'test_seconds_bucket{le="+Inf"} 3' in text
+    assert "test_seconds_count 3" in text
+
+
+def test_span_records_duration_and_failures():
+    count = SPAN_SECONDS.count(span="test")
+    with span("test"):
+        pass
+    with pytest.raises(KeyError), span("test"):
+        raise KeyError()
+
+    assert SPAN_SECONDS.count(span="test") == count + 2
+    assert FAILURES.get(span="test", error="KeyError") >= 1
+
+
+def test_spans_are_logged_and_cancellations_are_not_failures(caplog):
+    with caplog.at_level(logging.INFO, logger="gucker.metrics"):
+        with pytest.raises(asyncio.CancelledError), span("cancelled", path="a.tif"):
+            raise asyncio.CancelledError()
+
+    assert FAILURES.get(span="cancelled", error="CancelledError") == 0
+    (record,) = caplog.records
+    assert record.levelno == logging.INFO
+    assert record.span == "cancelled" and record.path == "a.tif"
+
+
+def test_json_logs_include_span_attributes():
+    record = logging.LogRecord("gucker", logging.INFO, "", 0, "uploaded", None, None)
+    record.span, record.bytes = "upload_bigfile", 42
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "uploaded"
+    assert entry["span"] == "upload_bigfile" and entry["bytes"] == 42
+
+
+def test_http_endpoint():
+    server = start_http_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        assert "gucker_uploaded_bytes_total" in urllib.request.urlopen(url).read().decode()
+    finally:
+        server.shutdown()
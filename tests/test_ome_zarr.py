@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+from types import SimpleNamespace
+
+from gucker.ome_zarr import copy_store, export_zarr, is_ngff_order, write_ngff_metadata
+
+
+class LocalFS:
+    """The part of the fsspec interface used to copy stores"""
+
+    def __init__(self) -> None:
+        self.gets = 0
+
+    def _strip_protocol(self, path: str) -> str:
+        return path.replace("file://", "")
+
+    def find(self, path: str) -> list:
+        return sorted(
+            os.path.join(root, file).replace(os.sep, "/")
+            for root, _, files in os.walk(path)
+            for file in files
+        )
+
+    def get(self, sources: list, targets: list) -> None:
+        self.gets += 1
+        for source, target in zip(sources, targets):
+            shutil.copyfile(source, target)
+
+
+def write_store(path: str, dims: tuple = ("c", "y", "x")) -> None:
+    os.makedirs(os.path.join(path, "data", "0.0.0"))
+    with open(os.path.join(path, ".zgroup"), "w") as f:
+        json.dump({"zarr_format": 2}, f)
+    with open(os.path.join(path, "data", ".zarray"), "w") as f:
+        json.dump({"shape": [1] * (len(dims) - 2) + [4, 4]}, f)
+    with open(os.path.join(path, "data", ".zattrs"), "w") as f:
+        json.dump({"_ARRAY_DIMENSIONS": list(dims)}, f)
+    with open(os.path.join(path, "data", "0.0.0", "0"), "wb") as f:
+        f.write(b"chunk")
+
+
+def test_copy_store_copies_all_keys_in_one_batch(tmp_path):
+    source = (tmp_path / "bucket" / "store").as_posix()
+    write_store(source)
+    fs = LocalFS()
+
+    files = copy_store(SimpleNamespace(value=f"file://{source}"), str(tmp_path / "copy"), fs=fs)
+
+    assert fs.gets == 1
+    assert len(files) == 4
+    with open(tmp_path / "copy" / "data" / "0.0.0" / "0", "rb") as f:
+        assert f.read() == b"chunk"
+
+
+def test_write_ngff_metadata_declares_the_stored_axes(tmp_path):
+    write_store(str(tmp_path))
+
+    path = write_ngff_metadata(str(tmp_path), "Image", SimpleNamespace(x=0.5, y=0.5, z=2, c=3))
+
+    with open(path) as f:
+        attrs = json.load(f)
+    (multiscale,) = attrs["multiscales"]
+    assert [axis["name"] for axis in multiscale["axes"]] == ["c", "y", "x"]
+    assert multiscale["axes"][0] == {"name": "c", "type": "channel"}
+    (dataset,) = multiscale["datasets"]
+    assert dataset["path"] == "data"
+    assert dataset["coordinateTransformations"][0]["scale"] == [1.0, 0.5, 0.5]
+
+
+def test_ngff_order():
+    assert is_ngff_order(["t", "c", "z", "y", "x"])
+    assert is_ngff_order(["y", "x"])
+    assert not is_ngff_order(["c", "t", "z", "y", "x"])
+    assert not is_ngff_order(["t", "c"])
+    assert not is_ngff_order(["y", "x", "c"])
+
+
+def test_axes_out_of_ngff_order_are_exported_as_plain_zarr(tmp_path):
+    source = tmp_path / "store"
+    write_store(str(source), dims=("c", "t", "z", "y", "x"))
+    representation = SimpleNamespace(
+        id="1", name="Image", store=SimpleNamespace(value=source.as_posix()), omero=None
+    )
+
+    files = export_zarr(representation, str(tmp_path / "copy"), fs=LocalFS())
+
+    assert len(files) == 4
+    assert not (tmp_path / "copy" / ".zattrs").exists()
+
+
+def test_export_zarr_without_arrays_only_copies(tmp_path):
+    source = tmp_path / "store"
+    source.mkdir()
+    (source / ".zgroup").write_text("{}")
+    representation = SimpleNamespace(
+        id="1", name="Empty", store=SimpleNamespace(value=source.as_posix()), omero=None
+    )
+
+    files = export_zarr(representation, str(tmp_path / "copy"), fs=LocalFS())
+
+    assert files == [str(tmp_path / "copy" / ".zgroup")]
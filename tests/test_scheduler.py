@@ -0,0 +1,35 @@
+import datetime
+
+import pytest
+
+from gucker.scheduler import BandwidthLimiter, parse_schedule
+
+
+def test_parse_schedule():
+    assert parse_schedule("08:00-20:00=2; 20:00-08:00=0") == [
+        (8 * 60, 20 * 60, 2 * 1024**2),
+        (20 * 60, 8 * 60, 0),
+    ]
+    with pytest.raises(ValueError):
+        parse_schedule("8-20=2")
+
+
+def test_rate_follows_the_schedule():
+    limiter = BandwidthLimiter(rate=5, schedule="08:00-20:00=1;22:00-06:00=0")
+    assert limiter.rate_at(datetime.datetime(2024, 1, 1, 12, 0)) == 1024**2
+    assert limiter.rate_at(datetime.datetime(2024, 1, 1, 21, 0)) == 5
+    assert limiter.rate_at(datetime.datetime(2024, 1, 1, 23, 0)) == 0
+    assert limiter.rate_at(datetime.datetime(2024, 1, 1, 3, 0)) == 0
+
+
+def test_uploads_wait_while_in_debt():
+    limiter = BandwidthLimiter(rate=1000)
+    assert limiter.acquire(10_000)
+    assert not limiter.acquire(1)
+    assert 9 < limiter.delay() <= 10
+
+
+def test_unlimited_admits_everything():
+    limiter = BandwidthLimiter()
+    assert all(limiter.acquire(10**12) for _ in range(3))
+    assert limiter.delay() == 0
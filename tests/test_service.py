@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+pytest.importorskip("mikro")
+pytest.importorskip("numpy")
+
+from benchmarks.fake_mikro import FakeMikro  # noqa: E402
+from gucker.service import GuckerService, Settings  # noqa: E402
+
+
+@pytest.fixture
+def mikro(tmp_path, monkeypatch):
+    monkeypatch.setenv("GUCKER_DATA_DIR", str(tmp_path / "data"))
+    fake = FakeMikro(str(tmp_path / "bucket"))
+    with fake.patch():
+        yield fake
+
+
+@pytest.fixture
+def service(tmp_path):
+    watch_dir = tmp_path / "watch"
+    watch_dir.mkdir()
+    for name in ["a.tif", "b.tif"]:
+        (watch_dir / name).write_bytes(name.encode())
+    return GuckerService(str(watch_dir), settings=Settings(grace_period=0, watcher="polling"))
+
+
+def stream(service, dataset, **kwargs):
+    return sorted(file.name for file in service.stream_files(dataset, None, **kwargs))
+
+
+def test_files_are_uploaded_again_to_another_dataset(mikro, service):
+    first, second = mikro.create_dataset("A"), mikro.create_dataset("B")
+
+    assert stream(service, first) == ["a.tif", "b.tif"]
+    assert stream(service, first) == []
+    assert stream(service, second) == ["a.tif", "b.tif"]
+    assert len(mikro.files) == 4
+
+
+def test_files_uploaded_in_archives_are_not_reused(mikro, service, tmp_path):
+    dataset = mikro.create_dataset("A")
+    assert stream(service, dataset, batch_threshold_kb=1)[0].startswith("batch-")
+
+    (tmp_path / "watch" / "copy.tif").write_bytes(b"a.tif")
+    assert stream(service, dataset, deduplicate=True) == ["copy.tif"]
+
+    # Exact uploads are still reused
+    (tmp_path / "watch" / "second copy.tif").write_bytes(b"a.tif")
+    assert stream(service, dataset, deduplicate=True) == ["copy.tif"]
+
+
+def test_uploads_of_files_that_vanish_are_kept(mikro, service, tmp_path, monkeypatch):
+    upload_bigfile = mikro.upload_bigfile
+
+    def upload_and_move(file, datasets=None, **kwargs):
+        uploaded = upload_bigfile(file, datasets)
+        os.remove(file)
+        return uploaded
+
+    monkeypatch.setattr("gucker.service.upload_bigfile", upload_and_move)
+    assert stream(service, mikro.create_dataset("A")) == ["a.tif", "b.tif"]
+    assert len(mikro.files) == 2
+
+
+def test_one_shot_streams_do_not_wait_for_missing_markers(mikro, service, tmp_path, caplog):
+    (tmp_path / "watch" / "a.tif.done").write_bytes(b"")
+
+    assert stream(service, mikro.create_dataset("A"), done_marker=".done") == ["a.tif"]
+    assert "Not uploading 1 files without a .done marker" in caplog.text
+
+
+def test_files_that_vanish_while_queued_are_skipped(mikro, service, tmp_path, monkeypatch):
+    upload_bigfile = mikro.upload_bigfile
+
+    def upload_and_remove_the_other(file, datasets=None, **kwargs):
+        uploaded = upload_bigfile(file, datasets)
+        for name in ["a.tif", "b.tif"]:
+            if os.path.exists(tmp_path / "watch" / name):
+                os.remove(tmp_path / "watch" / name)
+        return uploaded
+
+    monkeypatch.setattr("gucker.service.upload_bigfile", upload_and_remove_the_other)
+    assert len(stream(service, mikro.create_dataset("A"), concurrency=1)) == 1
+    assert len(mikro.files) == 1
+
+
+def test_streaming_without_a_directory_creates_no_dataset(mikro):
+    service = GuckerService(settings=Settings(watcher="polling"))
+
+    with pytest.raises(ValueError, match="No directory"):
+        next(service.stream_files(None, None))
+    assert not mikro.datasets
+
+
+def test_transcoded_files_are_uploaded(mikro, service, tmp_path):
+    np = pytest.importorskip("numpy")
+    tifffile = pytest.importorskip("tifffile")
+    data = np.arange(2 * 16 * 16, dtype=np.uint16).reshape(2, 16, 16)
+    for name in ["a.tif", "b.tif"]:
+        tifffile.imwrite(tmp_path / "watch" / name, data)
+
+    dataset = mikro.create_dataset("A")
+    assert stream(service, dataset, compress=r".*\.tif=zlib") == ["a.tif", "b.tif"]
+    for file in mikro.files.values():
+        with tifffile.TiffFile(file.file.value) as tif:
+            assert tif.pages[0].compression == tifffile.COMPRESSION.ADOBE_DEFLATE
+            assert (tif.asarray() == data).all()
+    # The originals are kept, the staged copies are removed
+    with tifffile.TiffFile(tmp_path / "watch" / "a.tif") as tif:
+        assert tif.pages[0].compression == tifffile.COMPRESSION.NONE
+    assert not os.listdir(tmp_path / "data" / "staging")
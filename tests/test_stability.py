@@ -0,0 +1,54 @@
+import time
+
+from gucker.stability import StabilityTracker
+
+
+def test_file_is_ready_after_grace_period(tmp_path):
+    file = tmp_path / "image.tif"
+    file.write_bytes(b"1")
+
+    tracker = StabilityTracker(grace_period=0.2)
+    tracker.add(str(file))
+    assert tracker.ready() == []
+
+    file.write_bytes(b"12")
+    time.sleep(0.1)
+    assert tracker.ready() == []
+
+    time.sleep(0.25)
+    assert tracker.ready() == [str(file)]
+    assert tracker.pending == 0
+
+
+def test_marker_and_closed_files(tmp_path):
+    file, other = tmp_path / "image.tif", tmp_path / "other.tif"
+    file.write_bytes(b"1")
+    other.write_bytes(b"1")
+
+    tracker = StabilityTracker(grace_period=60, marker_suffix=".done")
+    tracker.add(str(file))
+    tracker.add(str(file) + ".done")
+    assert tracker.ready() == []
+
+    (tmp_path / "image.tif.done").write_bytes(b"")
+    assert tracker.ready() == [str(file)]
+
+    tracker = StabilityTracker(grace_period=60)
+    tracker.add(str(other))
+    tracker.mark_closed(str(other))
+    assert tracker.ready() == [str(other)]
+
+
+def test_files_waiting_for_a_marker_are_dropped_when_they_disappear(tmp_path):
+    file = tmp_path / "image.tif"
+    file.write_bytes(b"1")
+
+    tracker = StabilityTracker(marker_suffix=".done")
+    tracker.add(str(file))
+    assert tracker.ready() == []
+    assert tracker.awaiting_marker == [str(file)]
+
+    file.unlink()
+    (tmp_path / "image.tif.done").write_bytes(b"")
+    assert tracker.ready() == []
+    assert tracker.pending == 0
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from gucker.tables import (  # noqa: E402
+    TableFormat,
+    export_table,
+    rois_frame,
+    rois_meta_frame,
+    write_frame,
+)
+
+
+def _roi(id, type, *points):
+    vectors = [SimpleNamespace(x=x, y=y, z=0, t=0, c=None) for x, y in points]
+    return SimpleNamespace(id=id, type=type, vectors=vectors)
+
+
+def test_rois_frame_has_a_row_per_vector():
+    frame = rois_frame([_roi("1", "RECTANGLE", (0, 0), (5, 5)), None, _roi("2", "POINT", (3, 4))])
+    assert list(frame.columns) == ["roi", "type", "vector", "x", "y", "z", "t", "c"]
+    assert list(frame["roi"]) == ["1", "1", "2"]
+    assert list(frame["vector"]) == [0, 1, 0]
+    assert list(frame["x"]) == [0, 5, 3]
+    assert frame["c"].isna().all()
+
+
+def test_rois_frame_skips_missing_vectors():
+    roi = _roi("1", "POLYGON", (0, 0), (5, 5))
+    roi.vectors.insert(1, None)
+    frame = rois_frame([roi, SimpleNamespace(id="2", type="POINT", vectors=None)])
+    assert list(frame["vector"]) == [0, 1]
+    assert list(frame["x"]) == [0, 5]
+
+
+class _Model(SimpleNamespace):
+    def dict(self):
+        return {
+            key: value.dict() if isinstance(value, _Model) else value
+            for key, value in vars(self).items()
+        }
+
+
+def test_rois_meta_frame_has_a_row_per_roi():
+    roi = _Model(
+        id=1,
+        type="POINT",
+        creator=_Model(sub="alice"),
+        comments=[{"id": "7"}],
+        vectors=[],
+        derived_representations=[],
+    )
+    frame = rois_meta_frame([None, roi])
+    assert list(frame.columns) == ["roi", "type", "comments", "creator.sub"]
+    assert list(frame["roi"]) == ["1"]
+    assert list(frame["creator.sub"]) == ["alice"]
+    assert list(frame["comments"]) == ['[{"id": "7"}]']
+
+
+def test_write_frame(tmp_path):
+    frame = rois_frame([_roi("1", "POINT", (1, 2))])
+    path = write_frame(frame, str(tmp_path / "rois"), TableFormat.CSV)
+    assert path.endswith("rois.csv")
+    assert list(pd.read_csv(path)["y"]) == [2]
+
+
+def test_export_table_falls_back_to_the_loaded_table(tmp_path):
+    table = SimpleNamespace(id="1", store=None, data=pd.DataFrame({"area": [1.5, 2.5]}))
+    path = export_table(table, str(tmp_path / "table"), TableFormat.CSV)
+    assert list(pd.read_csv(path)["area"]) == [1.5, 2.5]
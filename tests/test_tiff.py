@@ -0,0 +1,29 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+tifffile = pytest.importorskip("tifffile")
+da = pytest.importorskip("dask.array")
+
+from gucker.tiff import _block_shape, iter_planes, write_tiff  # noqa: E402
+
+
+def test_blocks_span_dimensions_whose_inner_chunks_are_complete():
+    assert _block_shape(da.zeros((4, 3, 8, 8), chunks=(2, 3, 8, 8))) == (2, 3)
+    assert _block_shape(da.zeros((2, 3, 8, 8), chunks=(2, 1, 8, 8))) == (1, 1)
+    assert _block_shape(np.zeros((2, 3, 8, 8))) == (1, 1)
+
+
+def test_planes_are_yielded_in_c_order():
+    data = np.arange(2 * 3 * 4 * 4).reshape(2, 3, 4, 4)
+    planes = list(iter_planes(da.from_array(data, chunks=(2, 1, 2, 4))))
+    assert len(planes) == 6
+    np.testing.assert_array_equal(np.stack(planes).reshape(data.shape), data)
+
+
+def test_chunked_dask_arrays_round_trip(tmp_path):
+    data = np.random.randint(0, 2**12, size=(2, 3, 16, 16), dtype=np.uint16)
+    path = str(tmp_path / "image.tiff")
+
+    write_tiff(path, da.from_array(data, chunks=(2, 1, 8, 16)))
+
+    np.testing.assert_array_equal(tifffile.imread(path), data)
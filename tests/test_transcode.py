@@ -0,0 +1,47 @@
+import pytest
+
+from gucker.transcode import Transcoder, parse_rules, recompress_tiff
+
+
+def test_rules_pick_the_first_matching_codec(tmp_path):
+    transcoder = Transcoder(r"raw/.*\.tif=zstd; .*\.tiff?=zlib", str(tmp_path))
+    assert transcoder.codec_for("raw/1.tif") == "zstd"
+    assert transcoder.codec_for("processed/1.tiff") == "zlib"
+    assert transcoder.codec_for("notes.txt") is None
+    assert Transcoder("", str(tmp_path)).codec_for("1.tif") is None
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError):
+        parse_rules(r".*\.tif")
+
+
+def write_planes(path, data):
+    tifffile = pytest.importorskip("tifffile")
+    with tifffile.TiffWriter(path) as tif:
+        for i, plane in enumerate(data):
+            tif.write(
+                plane,
+                description=f"plane {i}",
+                resolution=(2, 4),
+                resolutionunit="CENTIMETER",
+                metadata=None,
+            )
+
+
+def test_recompression_is_lossless(tmp_path):
+    np = pytest.importorskip("numpy")
+    tifffile = pytest.importorskip("tifffile")
+    data = np.random.default_rng(0).integers(0, 4096, (3, 16, 16), dtype=np.uint16)
+    source, destination = str(tmp_path / "raw.tif"), str(tmp_path / "staged" / "raw.tif")
+    write_planes(source, data)
+
+    assert recompress_tiff(source, destination, "zlib") == destination
+    with tifffile.TiffFile(source) as original, tifffile.TiffFile(destination) as recompressed:
+        assert len(recompressed.pages) == 3
+        for page, copy in zip(original.pages, recompressed.pages):
+            assert copy.compression == tifffile.COMPRESSION.ADOBE_DEFLATE
+            assert (copy.asarray() == page.asarray()).all()
+            assert copy.description == page.description
+            assert copy.get_resolution() == page.get_resolution()
+            assert copy.resolutionunit == page.resolutionunit
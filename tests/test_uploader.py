@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+import pytest
+
+from gucker.uploader import UploadPool, retry
+
+
+def _drain(pool):
+    results = []
+    while not pool.idle:
+        results += [path for path, _ in pool.collect(timeout=1)]
+    return results
+
+
+def test_ordered_results_follow_submission(tmp_path):
+    slow, fast = tmp_path / "slow.tif", tmp_path / "fast.tif"
+    slow.write_bytes(b"1")
+    fast.write_bytes(b"1")
+
+    def upload(path):
+        if path.endswith("slow.tif"):
+            time.sleep(0.2)
+        return path
+
+    with UploadPool(upload, max_workers=2, ordered=True) as pool:
+        pool.submit(str(slow))
+        pool.submit(str(fast))
+        assert _drain(pool) == [str(slow), str(fast)]
+
+    with UploadPool(upload, max_workers=2, ordered=False) as pool:
+        pool.submit(str(slow))
+        pool.submit(str(fast))
+        assert _drain(pool) == [str(fast), str(slow)]
+
+
+def test_inflight_bytes_are_bounded(tmp_path):
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def upload(path):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return path
+
+    files = []
+    for i in range(6):
+        file = tmp_path / f"{i}.tif"
+        file.write_bytes(b"x" * 100)
+        files.append(str(file))
+
+    with UploadPool(upload, max_workers=6, max_inflight_bytes=200) as pool:
+        for file in files:
+            pool.submit(file)
+        assert _drain(pool) == files
+
+    assert peak[0] == 2
+
+
+def test_failed_calls_are_retried():
+    attempts = []
+
+    def upload():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("network blip")
+        return "file"
+
+    assert retry(upload, "Uploading", retries=3, backoff=0.01) == "file"
+    assert len(attempts) == 3
+
+    attempts.clear()
+    with pytest.raises(ConnectionError):
+        retry(upload, "Uploading", retries=1, backoff=0.01)
+    assert len(attempts) == 2
+
+
+def test_queued_uploads_start_by_priority(tmp_path):
+    started = []
+    release = threading.Event()
+
+    def upload(path):
+        started.append(os.path.basename(path))
+        release.wait(1)
+        return path
+
+    paths = []
+    for name, size in [("first.tif", 1), ("raw.tif", 100), ("meta.json", 1)]:
+        path = tmp_path / name
+        path.write_bytes(b"1" * size)
+        paths.append(str(path))
+
+    with UploadPool(upload, max_workers=1, priority=lambda path, size: size >= 10) as pool:
+        for path in paths:
+            pool.submit(path)
+        release.set()
+        assert _drain(pool) == paths
+    assert started == ["first.tif", "meta.json", "raw.tif"]
+
+
+def test_files_that_vanished_are_skipped(tmp_path):
+    file = tmp_path / "kept.tif"
+    file.write_bytes(b"1")
+
+    with UploadPool(lambda path: path) as pool:
+        assert not pool.submit(str(tmp_path / "moved.tif"))
+        assert pool.submit(str(file))
+        assert _drain(pool) == [str(file)]
@@ -0,0 +1,66 @@
+import os
+
+from gucker.watcher import PathFilter, PollingWatcher, get_watcher
+import pytest
+
+
+def test_polling_watcher_reports_new_files(tmp_path):
+    (tmp_path / "existing.tif").write_bytes(b"1")
+    (tmp_path / "ignored.txt").write_bytes(b"1")
+
+    with PollingWatcher(str(tmp_path), filter=PathFilter(include=r".*\.tif")) as watcher:
+        assert [p.endswith("existing.tif") for p in watcher.scan()] == [True]
+        assert watcher.poll(timeout=0) == []
+
+        (tmp_path / "new.tif").write_bytes(b"1")
+        new_files = watcher.poll(timeout=0)
+        assert len(new_files) == 1 and new_files[0].endswith("new.tif")
+        assert watcher.poll(timeout=0) == []
+
+
+def test_recursive_polling_watcher_skips_excluded_subtrees(tmp_path):
+    field = tmp_path / "plate" / "A1" / "field1"
+    field.mkdir(parents=True)
+    (tmp_path / "plate" / "thumbs").mkdir()
+    (field / "1.tif").write_bytes(b"1")
+    (tmp_path / "plate" / "thumbs" / "1.tif").write_bytes(b"1")
+
+    watcher = PollingWatcher(
+        str(tmp_path), filter=PathFilter(include=r".*\.tif", exclude=r".*/thumbs"), recursive=True
+    )
+    assert watcher.scan() == [str(field / "1.tif")]
+
+    (field / "2.tif").write_bytes(b"1")
+    (tmp_path / "plate" / "thumbs" / "2.tif").write_bytes(b"1")
+    assert watcher.poll(timeout=0) == [str(field / "2.tif")]
+
+
+def test_non_recursive_watcher_ignores_subfolders(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "1.tif").write_bytes(b"1")
+    (tmp_path / "1.tif").write_bytes(b"1")
+
+    watcher = PollingWatcher(str(tmp_path))
+    assert watcher.scan() == [os.path.join(str(tmp_path), "1.tif")]
+    assert not PathFilter().accepts("sub/1.tif", recursive=False)
+
+
+def test_unknown_backend(tmp_path):
+    with pytest.raises(ValueError):
+        get_watcher(str(tmp_path), backend="carrier-pigeon")
+
+
+def test_auto_backend_polls_when_native_watching_fails(tmp_path, monkeypatch, caplog):
+    pytest.importorskip("watchdog")
+
+    class ExhaustedObserver:
+        def schedule(self, *args, **kwargs):
+            pass
+
+        def start(self):
+            raise OSError(28, "inotify watch limit reached")
+
+    monkeypatch.setattr("gucker.watcher.Observer", ExhaustedObserver)
+    with get_watcher(str(tmp_path), backend="auto") as watcher:
+        assert isinstance(watcher, PollingWatcher)
+    assert "polling instead" in caplog.text